@@ -0,0 +1,130 @@
+"""
+Microbenchmark for PDFOutlineExtractor.is_heading.
+
+Runs the compiled classifier and the previous per-call regex loop over the
+lines of the sample PDFs (plus synthetic variants), checks that both return
+the same level for every line and reports the time per call.
+
+    python benchmarks/bench_classifier.py
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import timeit
+from typing import Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from process_pdfs import PDFOutlineExtractor  # noqa: E402
+
+LEGACY_NUMBERING_PATTERNS = [
+    r'^\d+\.\s+',
+    r'^\d+\.\d+\s+',
+    r'^\d+\.\d+\.\d+\s+',
+    r'^[A-Z]\.\s+',
+    r'^[a-z]\)\s+',
+    r'^\([a-z]\)\s+',
+    r'^\([0-9]+\)\s+',
+    r'^[IVX]+\.\s+',
+    r'^[ivx]+\.\s+',
+]
+
+
+def legacy_is_heading(text: str, font_size: float, flags: int, page_num: int, context: Dict) -> Optional[str]:
+    """The is_heading implementation before the compiled classifier"""
+    text = text.strip()
+    if len(text) < 3 or len(text) > 120:
+        return None
+    if re.match(r'^(page|página|seite|pagina|страница)\s+\d+', text.lower()):
+        return None
+    if re.match(r'^(copyright|©|\d{4})', text.lower()):
+        return None
+    if re.match(r'^[A-Za-z0-9\u4e00-\u9fff\u0600-\u06ff]{1,2}$', text):
+        return None
+    is_bold = bool(flags & 16)
+    for pattern in LEGACY_NUMBERING_PATTERNS:
+        if re.match(pattern, text):
+            if len(text.split()) <= 12:
+                if re.match(r'^\d+\.\d+\.\d+\s+', text):
+                    return 'H3'
+                elif re.match(r'^\d+\.\d+\s+', text):
+                    return 'H2'
+                elif re.match(r'^\d+\.\s+', text):
+                    return 'H1'
+                elif re.match(r'^[A-Z]\.\s+', text):
+                    return 'H2'
+                elif re.match(r'^[IVX]+\.\s+', text, re.IGNORECASE):
+                    return 'H1' if text.isupper() else 'H2'
+                else:
+                    return 'H2'
+    if font_size >= 15.5 and len(text.split()) <= 15:
+        if text[0].isupper():
+            return 'H1'
+    elif font_size >= 13.5 and font_size < 15.5 and len(text.split()) <= 15:
+        if text[0].isupper():
+            return 'H2'
+    if ((font_size >= 14 and is_bold) or font_size >= 16):
+        if text[0].isupper() and len(text.split()) <= 12:
+            return 'H1'
+    elif font_size >= 12 and is_bold:
+        if text[0].isupper() and len(text.split()) <= 18:
+            return 'H2'
+    elif font_size >= 10 and is_bold:
+        if text[0].isupper() and len(text.split()) <= 25:
+            return 'H3'
+    return None
+
+
+def sample_lines():
+    """Lines from the sample PDFs, each also tried with numbering prefixes and font variants"""
+    extractor = PDFOutlineExtractor()
+    lines = []
+    for pdf_path in sorted(glob.glob(os.path.join(ROOT, "input", "*.pdf"))):
+        for page_data in extractor.iter_pages(pdf_path):
+            for line in page_data['lines']:
+                lines.append((line['text'], line['size'], line['flags']))
+
+    prefixes = ["1. ", "2.1 ", "3.2.1 ", "A. ", "IV. ", "iv. ", "I. ", "a) ", "(b) ", "(12) ", "Page 3 ", "2003 "]
+    variants = []
+    for i, (text, size, flags) in enumerate(lines[:400]):
+        prefix = prefixes[i % len(prefixes)]
+        variants.append((prefix + text, size, flags))
+        variants.append((text.upper(), 16.0, flags | 16))
+        variants.append((text, 12.0, 16))
+    return lines + variants
+
+
+def main():
+    parser = argparse.ArgumentParser(description="is_heading microbenchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    extractor = PDFOutlineExtractor()
+    context = {'avg_font_size': 10}
+    lines = sample_lines()
+
+    mismatches = [
+        (text, size, flags) for text, size, flags in lines
+        if extractor.is_heading(text, size, flags, 1, context) != legacy_is_heading(text, size, flags, 1, context)
+    ]
+    if mismatches:
+        print(f"MISMATCH on {len(mismatches)} lines, e.g. {mismatches[:3]}")
+        sys.exit(1)
+
+    def run(fn):
+        for text, size, flags in lines:
+            fn(text, size, flags, 1, context)
+
+    legacy = min(timeit.repeat(lambda: run(legacy_is_heading), number=1, repeat=args.repeat))
+    compiled = min(timeit.repeat(lambda: run(extractor.is_heading), number=1, repeat=args.repeat))
+    per_line = 1e6 / len(lines)
+    print(f"{len(lines)} lines, identical levels")
+    print(f"legacy:   {legacy * per_line:.2f} us/line")
+    print(f"compiled: {compiled * per_line:.2f} us/line ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Compares peak Python heap usage of the list-based, streaming and columnar
+extraction modes on synthetic PDFs of growing page counts.
+
+    python benchmarks/bench_memory.py --pages 50 200 800
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_pdfs import PDFOutlineExtractor  # noqa: E402
+from synthetic import make_synthetic_pdf  # noqa: E402
+
+
+MODES = {
+    'list': {},
+    'stream': {'streaming': True},
+    'columnar': {'columnar': True},
+}
+
+
+def measure(pdf_path: str, options: dict):
+    extractor = PDFOutlineExtractor(**options)
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = extractor._extract_outline(pdf_path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of the extraction modes")
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 200, 800])
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} " + " ".join(f"{name + ' MB':>12} {name + ' s':>11}" for name in MODES))
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            pdf_path = os.path.join(tmp, f"synthetic_{pages}.pdf")
+            make_synthetic_pdf(pdf_path, pages)
+            row = []
+            results = []
+            for options in MODES.values():
+                peak, elapsed, result = measure(pdf_path, options)
+                row.append(f"{peak / 2**20:>12.2f} {elapsed:>11.2f}")
+                results.append(result)
+            if any(result != results[0] for result in results):
+                print(f"WARNING: outputs differ for {pages} pages")
+            print(f"{pages:>6} " + " ".join(row))
+
+
+if __name__ == "__main__":
+    main()
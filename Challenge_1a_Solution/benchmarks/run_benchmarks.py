@@ -0,0 +1,191 @@
+"""
+Speed and accuracy benchmark for the Challenge 1a outline extractor.
+
+Runs the extractor over the sample PDFs with reference JSON and over
+synthetic PDFs generated locally, and reports pages/sec, per-stage time,
+peak RSS and heading precision/recall. Every case runs in a fresh process
+so peak RSS is per document.
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --pages 100 1000 --density 2 8 --compare bench.json
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fitz  # noqa: E402
+from process_pdfs import PDFOutlineExtractor  # noqa: E402
+from synthetic import make_synthetic_pdf  # noqa: E402
+
+# Relative drops that --compare reports as regressions
+SPEED_TOLERANCE = 0.15
+QUALITY_TOLERANCE = 0.01
+
+
+def heading_key(heading: Dict) -> tuple:
+    return heading['level'], ' '.join(heading['text'].split()), heading['page']
+
+
+def score_outline(predicted: List[Dict], expected: List[Dict]) -> Dict:
+    """Precision/recall of predicted headings, exact on (level, text, page) and on text/page only"""
+    scores = {}
+    for name, key in (('exact', heading_key), ('text', lambda h: heading_key(h)[1:])):
+        predicted_keys = set(map(key, predicted))
+        expected_keys = set(map(key, expected))
+        matched = len(predicted_keys & expected_keys)
+        precision = matched / len(predicted_keys) if predicted_keys else float(not expected_keys)
+        recall = matched / len(expected_keys) if expected_keys else 1.0
+        scores[name] = {'precision': round(precision, 4), 'recall': round(recall, 4)}
+    return scores
+
+
+def run_case(pdf_path: str, options: Dict) -> Dict:
+    """Extract one PDF with profiling on; runs in its own process"""
+    extractor = PDFOutlineExtractor(profile=True, **options)
+    result = extractor._extract_outline(pdf_path)
+    profile = extractor.last_profile
+    pages = profile.counts.get('pages', 0)
+    total = profile.total_seconds
+
+    return {
+        'pages': pages,
+        'lines': profile.counts.get('lines', 0),
+        'headings': len(result['outline']),
+        'seconds': round(total, 4),
+        'pages_per_sec': round(pages / total, 2) if total else None,
+        'stages': {name: round(seconds, 4) for name, seconds in profile.stages.items()},
+        'counts': dict(profile.counts),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'outline': result['outline'],
+    }
+
+
+def run_isolated(pdf_path: str, options: Dict) -> Dict:
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_case, pdf_path, options).result()
+
+
+def reference_cases(options: Dict) -> List[Dict]:
+    cases = []
+    for reference_path in sorted(glob.glob(os.path.join(ROOT, 'reference', '*.json'))):
+        name = os.path.basename(reference_path)[:-5]
+        pdf_path = os.path.join(ROOT, 'input', name + '.pdf')
+        if not os.path.exists(pdf_path):
+            continue
+        with open(reference_path, 'r', encoding='utf-8') as f:
+            expected = json.load(f).get('outline')
+        if expected is None:
+            continue
+        result = run_isolated(pdf_path, options)
+        result['accuracy'] = score_outline(result.pop('outline'), expected)
+        cases.append({'name': f'reference/{name}', **result})
+    return cases
+
+
+def synthetic_cases(page_counts: List[int], densities: List[int], options: Dict) -> List[Dict]:
+    cases = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in page_counts:
+            for density in densities:
+                pdf_path = os.path.join(tmp, f'synthetic_{pages}_{density}.pdf')
+                expected = make_synthetic_pdf(pdf_path, pages, headings_per_page=density)
+                result = run_isolated(pdf_path, options)
+                result['accuracy'] = score_outline(result.pop('outline'), expected)
+                cases.append({'name': f'synthetic/{pages}p-{density}h', **result})
+    return cases
+
+
+def compare(current: Dict, baseline: Dict) -> List[str]:
+    """List speed and quality regressions of current against a baseline run"""
+    regressions = []
+    baseline_cases = {case['name']: case for case in baseline.get('cases', [])}
+    for case in current['cases']:
+        old = baseline_cases.get(case['name'])
+        if not old:
+            continue
+        if old.get('pages_per_sec') and case.get('pages_per_sec'):
+            if case['pages_per_sec'] < old['pages_per_sec'] * (1 - SPEED_TOLERANCE):
+                regressions.append(f"{case['name']}: pages/sec {old['pages_per_sec']} -> {case['pages_per_sec']}")
+        for match, scores in case['accuracy'].items():
+            for metric, value in scores.items():
+                old_value = old['accuracy'].get(match, {}).get(metric)
+                if old_value is not None and value < old_value - QUALITY_TOLERANCE:
+                    regressions.append(f"{case['name']}: {match} {metric} {old_value} -> {value}")
+    return regressions
+
+
+def print_table(cases: List[Dict]):
+    print(f"{'case':<26} {'pages':>6} {'pages/s':>9} {'decode':>8} {'headings':>9} "
+          f"{'RSS MB':>7} {'P':>6} {'R':>6}")
+    for case in cases:
+        exact = case['accuracy']['exact']
+        print(f"{case['name']:<26} {case['pages']:>6} {case['pages_per_sec'] or 0:>9.1f} "
+              f"{case['stages'].get('decode', 0):>8.3f} {case['stages'].get('headings', 0):>9.4f} "
+              f"{case['peak_rss_mb']:>7.1f} {exact['precision']:>6.3f} {exact['recall']:>6.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Challenge 1a speed and accuracy benchmark")
+    parser.add_argument('--pages', type=int, nargs='*', default=[50, 500],
+                        help="Page counts of the synthetic PDFs")
+    parser.add_argument('--density', type=int, nargs='*', default=[3],
+                        help="Headings per page of the synthetic PDFs")
+    parser.add_argument('--no-reference', action='store_true', help="Skip the reference set")
+    parser.add_argument('--page-workers', type=int, default=1,
+                        help="Page-range workers for large PDFs (default 1: serial)")
+    parser.add_argument('--mode', choices=['list', 'streaming', 'columnar'], default='list',
+                        help="Extraction mode to benchmark")
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    parser.add_argument('--compare', help="Baseline JSON from an earlier run; exit 1 on regressions")
+    args = parser.parse_args()
+
+    options = {'page_workers': args.page_workers}
+    if args.mode != 'list':
+        options[args.mode] = True
+    cases = [] if args.no_reference else reference_cases(options)
+    cases += synthetic_cases(args.pages, args.density, options)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'pymupdf': fitz.VersionBind,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'options': options,
+        },
+        'cases': cases,
+    }
+    print_table(cases)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f))
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
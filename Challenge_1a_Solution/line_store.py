@@ -0,0 +1,115 @@
+import array
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+
+BOLD_FLAG = 16
+
+
+class LineStore:
+    """
+    Columnar storage for the formatted lines of a document.
+
+    One row per line: float64 font size, uint8 span flags, a float32 bbox
+    matrix and the 1-based page number. Line texts are concatenated into a
+    single string and addressed through an offset table, so a document costs
+    a handful of arrays instead of one dict per line.
+
+    Sizes stay doubles, as fitz reports them: the heading rules compare them
+    against fixed thresholds and averages, and rounding to float32 could move
+    a size onto a threshold and away from the scalar result. Bboxes are only
+    stored, never compared, so float32 halves them at no cost.
+    """
+
+    def __init__(self, text_blob: str, offsets: np.ndarray, sizes: np.ndarray, flags: np.ndarray,
+                 bboxes: np.ndarray, pages: np.ndarray, numbered: np.ndarray, page_count: int):
+        self.text_blob = text_blob
+        self.offsets = offsets
+        self.sizes = sizes
+        self.flags = flags
+        self.bboxes = bboxes
+        self.pages = pages
+        self.numbered = numbered
+        self.page_count = page_count
+        self.lengths = np.diff(offsets)
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[Dict],
+                   numbered_match: Optional[Callable[[str], object]] = None) -> 'LineStore':
+        """
+        Builds a store from page dicts as produced by PDFOutlineExtractor.iter_pages.
+
+        Pages are consumed one at a time, so a streaming page iterator never
+        materialises the per-line dicts of the whole document. numbered_match
+        flags lines that start with a section number.
+        """
+        texts = []
+        offsets = array.array('q', [0])
+        sizes = array.array('d')
+        flags = array.array('B')
+        bboxes = array.array('f')
+        page_nums = array.array('i')
+        numbered = array.array('B')
+        position = 0
+        page_count = 0
+
+        for page_data in pages:
+            page_count += 1
+            page_num = page_data['page_num']
+            for line in page_data['lines']:
+                text = line['text']
+                texts.append(text)
+                position += len(text)
+                offsets.append(position)
+                sizes.append(line['size'])
+                flags.append(line['flags'] & 0xFF)
+                bboxes.extend(line['bbox'])
+                page_nums.append(page_num)
+                numbered.append(1 if numbered_match and numbered_match(text) else 0)
+
+        return cls(
+            text_blob=''.join(texts),
+            offsets=np.frombuffer(offsets, dtype=np.int64),
+            sizes=np.frombuffer(sizes, dtype=np.float64),
+            flags=np.frombuffer(flags, dtype=np.uint8),
+            bboxes=np.frombuffer(bboxes, dtype=np.float32).reshape(-1, 4),
+            pages=np.frombuffer(page_nums, dtype=np.int32),
+            numbered=np.frombuffer(numbered, dtype=np.uint8).astype(bool),
+            page_count=page_count,
+        )
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def text(self, index: int) -> str:
+        return self.text_blob[self.offsets[index]:self.offsets[index + 1]]
+
+    def mean_size(self) -> Optional[float]:
+        """Average font size over all lines, or None for an empty document"""
+        if not len(self.sizes):
+            return None
+        # Summed left to right like FontStatistics; np.mean sums pairwise
+        return sum(self.sizes.tolist()) / len(self.sizes)
+
+    def title_candidates(self) -> np.ndarray:
+        """Indices of first-page lines long enough to be part of the title"""
+        mask = (self.pages == 1) & (self.lengths >= 5)
+        return np.flatnonzero(mask)
+
+    def heading_candidates(self) -> np.ndarray:
+        """
+        Indices of lines that can pass PDFOutlineExtractor.is_heading.
+
+        Mirrors its cheap thresholds: pages after the first, 3-120 characters,
+        and either a numbering prefix or a font that reaches one of the size
+        rules (>= 13.5, or bold and >= 10).
+        """
+        bold = (self.flags & BOLD_FLAG) != 0
+        font_rule = (self.sizes >= 13.5) | (bold & (self.sizes >= 10))
+        mask = (
+            (self.pages > 1)
+            & (self.lengths >= 3)
+            & (self.lengths <= 120)
+            & (font_rule | self.numbered)
+        )
+        return np.flatnonzero(mask)
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction runs without the inter-process lock
+    fcntl = None
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hex SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_sha256(source) -> str:
+    """Hex SHA-256 of a PDF given by path or held in memory (bytes-like)"""
+    if isinstance(source, (str, os.PathLike)):
+        return file_sha256(source)
+    return hashlib.sha256(source).hexdigest()
+
+
+class OutlineCache:
+    """
+    On-disk cache of outline results keyed by PDF content and extractor config.
+
+    Every entry is one JSON file named after sha256(content hash + fingerprint),
+    written to a temporary file and renamed into place, so concurrent readers
+    never see partial entries. Reads bump the file's mtime; when the directory
+    grows past max_bytes the least recently used entries are deleted under an
+    exclusive lock on a shared lock file. Several processes can share one
+    directory.
+
+    Subclasses store other payloads by overriding suffix, _encode and _decode.
+    """
+
+    suffix = '.json'
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, enabled: bool = True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._bytes_since_scan = None
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, pdf, fingerprint: str) -> str:
+        """Entry key of a PDF (a path or its bytes) under an extractor fingerprint"""
+        return hashlib.sha256(f"{source_sha256(pdf)}:{fingerprint}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = self._decode(f.read())
+        except (OSError, ValueError):  # missing, evicted mid-read or corrupt
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return result
+
+    def put(self, key: str, result: Dict):
+        if not self.enabled:
+            return
+        data = self._encode(result)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        # Rescan the directory on the first write and then after every tenth of the budget
+        if self._bytes_since_scan is None or self._bytes_since_scan + len(data) > self.max_bytes // 10:
+            self._bytes_since_scan = 0
+            self.evict()
+        else:
+            self._bytes_since_scan += len(data)
+
+    def evict(self):
+        """Delete least recently used entries until the cache is under 90% of max_bytes"""
+        with self._lock():
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(self.suffix):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+            target = self.max_bytes * 9 // 10
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+    def _encode(self, result) -> bytes:
+        return json.dumps(result, ensure_ascii=False).encode('utf-8')
+
+    def _decode(self, data: bytes):
+        return json.loads(data.decode('utf-8'))
+
+    @contextmanager
+    def _lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'directory': self.directory,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
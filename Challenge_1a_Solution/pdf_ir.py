@@ -0,0 +1,305 @@
+"""
+Span-level intermediate representation of a PDF, shared by Challenge 1A and 1B.
+
+page.get_text("dict") dominates the cost of both the outline extractor and
+the 1B page parser. DocumentIR is the one span walk over it: every text span
+(stripped text, font size, flags, bbox) grouped into lines and pages, stored
+in flat stdlib arrays. Each consumer builds its own view from it
+(PDFOutlineExtractor its formatted lines, the 1B parser its page texts and
+titles), so a PDF used by both is decoded once.
+
+to_bytes()/from_bytes() give a compact binary form (a fixed header, the raw
+arrays and the UTF-8 text), and IRCache keeps those files on disk keyed by
+PDF content, so the decode is also shared across processes and requests.
+"""
+import array
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+
+try:
+    from .outline_cache import OutlineCache
+except ImportError:
+    from outline_cache import OutlineCache
+
+# Bump when a change alters what is extracted, so cached IR files are not reused
+IR_VERSION = 1
+MAGIC = b'PDIR'
+# magic, version, page count, line count, span count, text bytes
+_HEADER = struct.Struct('<4sHIIIQ')
+
+# Documents with at least this many pages are split into page ranges decoded
+# in parallel worker processes (by the extractors and the Challenge 1B parser too)
+PARALLEL_PAGE_THRESHOLD = 200
+PAGE_RANGE_SIZE = 50
+
+# A PDF as the extractors take it: a path, its content, or a binary stream
+PDFSource = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
+
+def read_source(source: PDFSource) -> Union[str, bytes, bytearray, memoryview]:
+    """
+    Paths and buffers unchanged; a stream is read (from its current position)
+    into bytes, since a document may be opened more than once.
+    """
+    if hasattr(source, 'read'):
+        return source.read()
+    return source
+
+
+def open_pdf(source: PDFSource):
+    """Opens a PDF path, or a PDF held in memory, with PyMuPDF"""
+    if isinstance(source, (str, os.PathLike)):
+        return fitz.open(source)
+    return fitz.open(stream=read_source(source), filetype='pdf')
+
+
+def source_name(source: PDFSource) -> str:
+    """The path of a PDF, or a placeholder for one held in memory (for messages)"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if hasattr(source, 'read'):
+        return getattr(source, 'name', '<stream>')
+    return f"<{len(source)} bytes>"
+
+
+class Span(NamedTuple):
+    text: str  # stripped; empty spans are kept
+    size: float
+    flags: int
+    bbox: Tuple[float, float, float, float]
+
+
+def read_page(page) -> List[List[Span]]:
+    """The lines of a fitz page as lists of spans, in get_text("dict") order"""
+    lines = []
+    for block in page.get_text("dict")["blocks"]:
+        if "lines" not in block:
+            continue
+        for line in block["lines"]:
+            lines.append([
+                Span(span["text"].strip(), span["size"], span["flags"], tuple(span["bbox"]))
+                for span in line["spans"]
+            ])
+    return lines
+
+
+class DocumentIR:
+    """
+    Every span of a document in columnar arrays.
+
+    page_offsets and line_offsets are CSR-style offset tables (page -> lines,
+    line -> spans); span texts are one string addressed by text_offsets.
+    Sizes are kept as doubles so that font heuristics see the values fitz
+    reported; bboxes are float32.
+    """
+
+    def __init__(self, page_offsets: array.array, line_offsets: array.array, text_offsets: array.array,
+                 text_blob: str, sizes: array.array, flags: array.array, bboxes: array.array):
+        self.page_offsets = page_offsets
+        self.line_offsets = line_offsets
+        self.text_offsets = text_offsets
+        self.text_blob = text_blob
+        self.sizes = sizes
+        self.flags = flags
+        self.bboxes = bboxes
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_offsets) - 1
+
+    @property
+    def line_count(self) -> int:
+        return len(self.line_offsets) - 1
+
+    @property
+    def span_count(self) -> int:
+        return len(self.sizes)
+
+    @classmethod
+    def from_document(cls, doc, start: int = 0, stop: Optional[int] = None) -> 'DocumentIR':
+        """Reads pages [start, stop) of an open fitz document"""
+        stop = len(doc) if stop is None else stop
+        builder = _Builder()
+        for page_num in range(start, stop):
+            builder.add_page(read_page(doc[page_num]))
+        return builder.build()
+
+    @classmethod
+    def concat(cls, parts: Iterable['DocumentIR']) -> 'DocumentIR':
+        """Joins the IRs of consecutive page ranges into one document"""
+        builder = _Builder()
+        for part in parts:
+            builder.extend(part)
+        return builder.build()
+
+    def page_lines(self, index: int) -> List[List[Span]]:
+        """Lines of page `index` (0-based) as lists of spans"""
+        text_blob, text_offsets = self.text_blob, self.text_offsets
+        sizes, flags, bboxes = self.sizes, self.flags, self.bboxes
+        line_offsets = self.line_offsets
+        lines = []
+        for line in range(self.page_offsets[index], self.page_offsets[index + 1]):
+            lines.append([
+                Span(text_blob[text_offsets[span]:text_offsets[span + 1]], sizes[span], flags[span],
+                     tuple(bboxes[span * 4:span * 4 + 4]))
+                for span in range(line_offsets[line], line_offsets[line + 1])
+            ])
+        return lines
+
+    def to_bytes(self) -> bytes:
+        text = self.text_blob.encode('utf-8')
+        parts = [_HEADER.pack(MAGIC, IR_VERSION, self.page_count, self.line_count, self.span_count,
+                              len(text))]
+        for values in self._arrays():
+            if sys.byteorder == 'big':
+                values = array.array(values.typecode, values)
+                values.byteswap()
+            parts.append(values.tobytes())
+        parts.append(text)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'DocumentIR':
+        """Inverse of to_bytes; raises ValueError on a foreign, outdated or truncated buffer"""
+        data = memoryview(data)
+        if len(data) < _HEADER.size:
+            raise ValueError("truncated IR header")
+        magic, version, pages, lines, spans, text_bytes = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != IR_VERSION:
+            raise ValueError(f"not a version {IR_VERSION} IR buffer")
+
+        position = _HEADER.size
+        arrays = []
+        for typecode, count in (('I', pages + 1), ('I', lines + 1), ('I', spans + 1),
+                                ('d', spans), ('I', spans), ('f', spans * 4)):
+            values = array.array(typecode)
+            end = position + count * values.itemsize
+            if end > len(data):
+                raise ValueError("truncated IR arrays")
+            values.frombytes(data[position:end])
+            if sys.byteorder == 'big':
+                values.byteswap()
+            arrays.append(values)
+            position = end
+        if position + text_bytes != len(data):
+            raise ValueError("IR size does not match its header")
+        text_blob = bytes(data[position:]).decode('utf-8')
+
+        page_offsets, line_offsets, text_offsets, sizes, flags, bboxes = arrays
+        return cls(page_offsets, line_offsets, text_offsets, text_blob, sizes, flags, bboxes)
+
+    def _arrays(self) -> Tuple[array.array, ...]:
+        return (self.page_offsets, self.line_offsets, self.text_offsets, self.sizes, self.flags, self.bboxes)
+
+
+class _Builder:
+    """Accumulates pages (or whole IRs) into the arrays of a DocumentIR"""
+
+    def __init__(self):
+        self.page_offsets = array.array('I', [0])
+        self.line_offsets = array.array('I', [0])
+        self.text_offsets = array.array('I', [0])
+        self.texts = []
+        self.position = 0
+        self.sizes = array.array('d')
+        self.flags = array.array('I')
+        self.bboxes = array.array('f')
+
+    def add_page(self, lines: List[List[Span]]):
+        for spans in lines:
+            for text, size, flags, bbox in spans:
+                self.texts.append(text)
+                self.position += len(text)
+                self.text_offsets.append(self.position)
+                self.sizes.append(size)
+                self.flags.append(flags)
+                self.bboxes.extend(bbox)
+            self.line_offsets.append(len(self.sizes))
+        self.page_offsets.append(len(self.line_offsets) - 1)
+
+    def extend(self, ir: DocumentIR):
+        lines, spans = len(self.line_offsets) - 1, len(self.sizes)
+        self.page_offsets.extend(offset + lines for offset in ir.page_offsets[1:])
+        self.line_offsets.extend(offset + spans for offset in ir.line_offsets[1:])
+        self.text_offsets.extend(offset + self.position for offset in ir.text_offsets[1:])
+        self.texts.append(ir.text_blob)
+        self.position += len(ir.text_blob)
+        self.sizes.extend(ir.sizes)
+        self.flags.extend(ir.flags)
+        self.bboxes.extend(ir.bboxes)
+
+    def build(self) -> DocumentIR:
+        return DocumentIR(self.page_offsets, self.line_offsets, self.text_offsets, ''.join(self.texts),
+                          self.sizes, self.flags, self.bboxes)
+
+
+def read_page_range(pdf: PDFSource, start: int, stop: int) -> DocumentIR:
+    """IR of pages [start, stop) with its own document handle (page-range worker)"""
+    doc = open_pdf(pdf)
+    try:
+        return DocumentIR.from_document(doc, start, stop)
+    finally:
+        doc.close()
+
+
+def page_ranges(page_count: int, range_size: int = PAGE_RANGE_SIZE) -> List[Tuple[int, int]]:
+    return [(start, min(start + range_size, page_count)) for start in range(0, page_count, range_size)]
+
+
+def extract_document(pdf: PDFSource, workers: Optional[int] = None,
+                     parallel_threshold: int = PARALLEL_PAGE_THRESHOLD) -> DocumentIR:
+    """
+    IR of a whole PDF (a path or in-memory, see PDFSource). Documents with at
+    least parallel_threshold pages are read as page ranges by `workers`
+    processes (default: CPU count, 1 disables).
+    """
+    workers = workers or os.cpu_count() or 1
+    pdf = read_source(pdf)
+    doc = open_pdf(pdf)
+    try:
+        page_count = len(doc)
+        if workers == 1 or page_count < parallel_threshold:
+            return DocumentIR.from_document(doc)
+    finally:
+        doc.close()
+
+    if isinstance(pdf, memoryview):
+        pdf = bytes(pdf)  # pickled to the workers
+    ranges = page_ranges(page_count)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = pool.map(read_page_range, [pdf] * len(ranges),
+                         [start for start, _ in ranges], [stop for _, stop in ranges])
+        return DocumentIR.concat(parts)
+
+
+class IRCache(OutlineCache):
+    """
+    DocumentIR files (<key>.pdfir) keyed by PDF content, with the eviction,
+    locking and atomic writes of OutlineCache. Outline extraction and 1B
+    parsing pointed at the same directory decode each distinct PDF once.
+    """
+
+    suffix = '.pdfir'
+
+    def load_or_extract(self, pdf: PDFSource, workers: Optional[int] = None,
+                        parallel_threshold: int = PARALLEL_PAGE_THRESHOLD) -> DocumentIR:
+        if not self.enabled:
+            return extract_document(pdf, workers, parallel_threshold)
+        pdf = read_source(pdf)
+        key = self.key(pdf, f"ir{IR_VERSION}")
+        ir = self.get(key)
+        if ir is None:
+            ir = extract_document(pdf, workers, parallel_threshold)
+            self.put(key, ir)
+        return ir
+
+    def _encode(self, ir: DocumentIR) -> bytes:
+        return ir.to_bytes()
+
+    def _decode(self, data: bytes) -> DocumentIR:
+        return DocumentIR.from_bytes(data)
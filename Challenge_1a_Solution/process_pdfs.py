@@ -1,25 +1,99 @@
-import fitz  # PyMuPDF
 import json
 import re
 import os
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterator, NamedTuple, Callable
 import sys
+import time
+import argparse
 import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from .outline_cache import OutlineCache, file_sha256
+except ImportError:
+    from outline_cache import OutlineCache, file_sha256
+
+try:
+    from .profiling import StageProfiler, NULL_PROFILER
+except ImportError:
+    from profiling import StageProfiler, NULL_PROFILER
+
+try:
+    from .pdf_ir import (IRCache, PARALLEL_PAGE_THRESHOLD, PDFSource, open_pdf, page_ranges, read_page,
+                         read_source, source_name)
+except ImportError:
+    from pdf_ir import (IRCache, PARALLEL_PAGE_THRESHOLD, PDFSource, open_pdf, page_ranges, read_page,
+                        read_source, source_name)
+
+try:
+    try:
+        from .line_store import LineStore
+    except ImportError:
+        from line_store import LineStore
+except ImportError:  # numpy is optional; columnar mode needs it
+    LineStore = None
+
+# Page numbers and copyright lines, matched against the lowercased text
+_SKIP_RE = re.compile(r'(?:page|página|seite|pagina|страница)\s+\d+|copyright|©|\d{4}')
+
+# Simple numbering patterns that work universally, as one alternation.
+# Alternatives are tried in order, so the first named group that matches
+# gives the heading level directly.
+_NUMBERED_HEADING_RE = re.compile(r"""
+      (?P<h3>\d+\.\d+\.\d+\s)                           # 1.1.1 1.1.2
+    | (?P<h2>\d+\.\d+\s)                                # 1.1 1.2 2.1
+    | (?P<h1>\d+\.\s)                                   # 1. 2. 3.
+    | (?P<letter>[A-Z]\.\s)                             # A. B. C.
+    | (?P<roman>(?:[IVX]+|[ivx]+)\.\s)                  # I. II. III. / i. ii. iii.
+    | (?P<other>[a-z]\)\s|\([a-z]\)\s|\([0-9]+\)\s)     # a) (a) (1)
+""", re.VERBOSE)
+
+_NUMBERED_LEVELS = {
+    'h3': 'H3',
+    'h2': 'H2',
+    'h1': 'H1',
+    'letter': 'H2',
+    'roman': None,  # H1 when the whole line is uppercase, H2 otherwise
+    'other': 'H2',
+}
+
+
+# Bump when a change alters extraction output, so cached results are not reused
+EXTRACTOR_VERSION = "2"
+
+# Embedded bookmarks: minimum entries to trust them, deepest level kept
+MIN_BOOKMARKS = 2
+MAX_BOOKMARK_LEVEL = 3  # same H1-H3 levels as the layout outline
+
 
 class PDFOutlineExtractor:
-    def __init__(self):
-        # Simple numbering patterns that work universally
-        self.numbering_patterns = [
-            r'^\d+\.\s+',                    # 1. 2. 3.
-            r'^\d+\.\d+\s+',                 # 1.1 1.2 2.1
-            r'^\d+\.\d+\.\d+\s+',            # 1.1.1 1.1.2
-            r'^[A-Z]\.\s+',                  # A. B. C.
-            r'^[a-z]\)\s+',                  # a) b) c)
-            r'^\([a-z]\)\s+',                # (a) (b) (c)
-            r'^\([0-9]+\)\s+',               # (1) (2) (3)
-            r'^[IVX]+\.\s+',                 # I. II. III. IV. V.
-            r'^[ivx]+\.\s+',                 # i. ii. iii. iv. v.
-        ]
+    def __init__(self, streaming: bool = False, columnar: bool = False, use_bookmarks: bool = False,
+                 cache: Optional[OutlineCache] = None, page_workers: Optional[int] = None,
+                 parallel_page_threshold: int = PARALLEL_PAGE_THRESHOLD, profile: bool = False,
+                 on_profile: Optional[Callable[[StageProfiler], None]] = None,
+                 ir_cache: Optional[IRCache] = None):
+        # Decode and classify one page at a time instead of holding the whole document
+        self.streaming = streaming
+        # Keep lines in a NumPy column store and filter them with vectorized masks
+        if columnar and LineStore is None:
+            raise ImportError("columnar mode requires numpy")
+        self.columnar = columnar
+        # Use the document's embedded bookmarks when they look plausible
+        self.use_bookmarks = use_bookmarks
+        # Content-addressed result cache, consulted by extract_outline
+        self.cache = cache
+        self.last_cache_hit = None
+        # Page-range parallelism for large documents (page_workers=1 disables it)
+        self.page_workers = page_workers or os.cpu_count() or 1
+        self.parallel_page_threshold = parallel_page_threshold
+        # Per-document stage timings and counters; on_profile receives each finished profile
+        self.profile = profile or on_profile is not None
+        self.on_profile = on_profile
+        self.profiler = NULL_PROFILER
+        self.last_profile = None
+        # Decoded span IR shared with other consumers (e.g. the 1B parser) by PDF content
+        self.ir_cache = ir_cache
         
     def normalize_text(self, text: str) -> str:
         """Simple text normalization"""
@@ -28,49 +102,109 @@ class PDFOutlineExtractor:
         normalized = ''.join(c for c in normalized if unicodedata.category(c) != 'Mn')
         return normalized.lower().strip()
         
-    def extract_text_with_formatting(self, pdf_path: str) -> List[Dict]:
+    def extract_text_with_formatting(self, pdf: PDFSource) -> List[Dict]:
         """Extract text with font information from PDF"""
-        doc = fitz.open(pdf_path)
-        pages_data = []
+        return list(self.iter_pages(pdf))
+
+    def iter_pages(self, pdf: PDFSource) -> Iterator[Dict]:
+        """Yield the formatted lines of each page, one page at a time"""
+        if self.ir_cache is not None:
+            yield from self._iter_pages_ir(pdf)
+            return
+        doc = open_pdf(pdf)
+        try:
+            page_count = len(doc)
+            if self.page_workers > 1 and page_count >= self.parallel_page_threshold:
+                doc.close()
+                doc = None
+                yield from self._iter_pages_parallel(pdf, page_count)
+                return
+            profiler = self.profiler
+            for page_num in range(page_count):
+                with profiler.stage('decode'):
+                    page_data = self._page_data(doc[page_num], page_num)
+                profiler.count('pages')
+                profiler.count('lines', len(page_data['lines']))
+                yield page_data
+        finally:
+            if doc is not None:
+                doc.close()
+
+    def _iter_pages_parallel(self, pdf: PDFSource, page_count: int) -> Iterator[Dict]:
+        """Decode page ranges in worker processes and yield the pages in document order.
+
+        Each worker opens its own fitz handle. At most two ranges per worker
+        are in flight, so memory stays bounded in streaming mode.
+        """
+        if isinstance(pdf, memoryview):
+            pdf = bytes(pdf)  # pickled to the workers
+        ranges = iter(page_ranges(page_count))
+        with ProcessPoolExecutor(max_workers=self.page_workers) as pool:
+            pending = deque()
+            for start, stop in ranges:
+                pending.append(pool.submit(_extract_page_range, pdf, start, stop))
+                if len(pending) >= self.page_workers * 2:
+                    break
+            profiler = self.profiler
+            while pending:
+                with profiler.stage('decode'):
+                    pages = pending.popleft().result()
+                next_range = next(ranges, None)
+                if next_range:
+                    pending.append(pool.submit(_extract_page_range, pdf, *next_range))
+                profiler.count('pages', len(pages))
+                profiler.count('lines', sum(len(page_data['lines']) for page_data in pages))
+                yield from pages
+
+    def _iter_pages_ir(self, pdf: PDFSource) -> Iterator[Dict]:
+        """iter_pages from the cached span IR, decoding the PDF only on a miss"""
+        profiler = self.profiler
+        with profiler.stage('decode'):
+            ir = self.document_ir(pdf)
+        for page_num in range(ir.page_count):
+            page_data = self._page_data_from_lines(ir.page_lines(page_num), page_num)
+            profiler.count('pages')
+            profiler.count('lines', len(page_data['lines']))
+            yield page_data
+
+    def document_ir(self, pdf: PDFSource):
+        """The DocumentIR of a PDF through ir_cache"""
+        return self.ir_cache.load_or_extract(pdf, self.page_workers, self.parallel_page_threshold)
+
+    def _page_data(self, page, page_num: int) -> Dict:
+        """Extract the formatted lines of one page"""
+        return self._page_data_from_lines(read_page(page), page_num)
+
+    def _page_data_from_lines(self, lines: List[List], page_num: int) -> Dict:
+        """Formatted lines of a page from its span lines (see pdf_ir.read_page)"""
+        page_data = {
+            'page_num': page_num + 1,
+            'lines': []
+        }
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            blocks = page.get_text("dict")
+        for spans in lines:
+            texts = []
+            font_sizes = []
+            flags_list = []
+            bboxes = []
             
-            page_data = {
-                'page_num': page_num + 1,
-                'lines': []
-            }
+            for span in spans:
+                if span.text:
+                    texts.append(span.text)
+                    font_sizes.append(span.size)
+                    flags_list.append(span.flags)
+                    bboxes.append(span.bbox)
             
-            for block in blocks['blocks']:
-                if 'lines' in block:
-                    for line in block['lines']:
-                        line_text = ''
-                        font_sizes = []
-                        flags_list = []
-                        bboxes = []
-                        
-                        for span in line['spans']:
-                            text = span['text'].strip()
-                            if text:
-                                line_text += text + ' '
-                                font_sizes.append(span['size'])
-                                flags_list.append(span['flags'])
-                                bboxes.append(span['bbox'])
-                        
-                        if line_text.strip():
-                            # Use max font size and flags for the line
-                            page_data['lines'].append({
-                                'text': line_text.strip(),
-                                'size': max(font_sizes) if font_sizes else 10,
-                                'flags': max(flags_list) if flags_list else 0,
-                                'bbox': bboxes[0] if bboxes else [0, 0, 0, 0]
-                            })
-            
-            pages_data.append(page_data)
+            if texts:
+                # Use max font size and flags for the line
+                page_data['lines'].append({
+                    'text': ' '.join(texts),
+                    'size': max(font_sizes),
+                    'flags': max(flags_list),
+                    'bbox': bboxes[0]
+                })
         
-        doc.close()
-        return pages_data
+        return page_data
     
     def extract_title(self, pages_data: List[Dict]) -> str:
         """Extract document title from first page using largest bold text"""
@@ -108,183 +242,739 @@ class PDFOutlineExtractor:
         """Determine if text is a heading and what level (simple universal approach)"""
         text = text.strip()
         
-        # Skip very short or very long text
+        # Skip very short or very long text (this also covers single letters or numbers)
         if len(text) < 3 or len(text) > 120:
             return None
         
-        # Skip common non-heading patterns (basic universal patterns)
-        if re.match(r'^(page|página|seite|pagina|страница)\s+\d+', text.lower()):
-            return None
-        if re.match(r'^(copyright|©|\d{4})', text.lower()):
-            return None
+        profiler = self.profiler
+        if profiler.enabled:
+            profiler.count('regex_evaluations')
         
-        # Skip single letters or numbers
-        if re.match(r'^[A-Za-z0-9\u4e00-\u9fff\u0600-\u06ff]{1,2}$', text):
+        # Skip common non-heading patterns (basic universal patterns)
+        if _SKIP_RE.match(text.lower()):
             return None
         
-        text_lower = text.lower().strip()
+        # Features computed once per line
+        word_count = len(text.split())
+        starts_upper = text[0].isupper()
         is_bold = bool(flags & 16)
         
-        
         # Check for numbered sections (highest priority for clear headings)
-        for pattern in self.numbering_patterns:
-            if re.match(pattern, text):
-                # Additional check: if it looks like a section title (short and descriptive)
-                if len(text.split()) <= 12:  # Reasonable heading length
-                    # Determine heading level based on pattern complexity
-                    if re.match(r'^\d+\.\d+\.\d+\s+', text):  # 1.1.1
-                        return 'H3'
-                    elif re.match(r'^\d+\.\d+\s+', text):     # 1.1
-                        return 'H2'
-                    elif re.match(r'^\d+\.\s+', text):        # 1.
-                        return 'H1'
-                    elif re.match(r'^[A-Z]\.\s+', text):      # A.
-                        return 'H2'
-                    elif re.match(r'^[IVX]+\.\s+', text, re.IGNORECASE):  # Roman numerals
-                        return 'H1' if text.isupper() else 'H2'
-                    else:
-                        return 'H2'  # Default for other patterns
+        if word_count <= 12:  # Reasonable heading length
+            if profiler.enabled:
+                profiler.count('regex_evaluations')
+            match = _NUMBERED_HEADING_RE.match(text)
+            if match:
+                level = _NUMBERED_LEVELS[match.lastgroup]
+                if level is None:  # Roman numerals
+                    return 'H1' if text.isupper() else 'H2'
+                return level
         
         # Font size based classification (works universally)
         # Size 16.0+ = H1 (like "Acknowledgements", "1. Introduction")
-        if font_size >= 15.5 and len(text.split()) <= 15:
+        if font_size >= 15.5 and word_count <= 15:
             # Check if it starts with uppercase (works for most languages)
-            if text[0].isupper():
+            if starts_upper:
                 return 'H1'
         
         # Size 14.0 = H2 (like "2.1 Intended Audience", "2.2 Career Paths")  
-        elif font_size >= 13.5 and font_size < 15.5 and len(text.split()) <= 15:
-            if text[0].isupper():
+        elif font_size >= 13.5 and font_size < 15.5 and word_count <= 15:
+            if starts_upper:
                 return 'H2'
         
         # Font-based classification (fallback)
-        avg_font_size = context.get('avg_font_size', 10)
-        
         # H1: Large font (>=14) and bold, or very large font
         if ((font_size >= 14 and is_bold) or font_size >= 16):
             # Make sure it's not too long (likely paragraph) and starts with uppercase
-            if text[0].isupper() and len(text.split()) <= 12:
+            if starts_upper and word_count <= 12:
                 return 'H1'
         
         # H2: Medium font (12-14) and bold
         elif font_size >= 12 and is_bold:
-            if text[0].isupper() and len(text.split()) <= 18:
+            if starts_upper and word_count <= 18:
                 return 'H2'
         
         # H3: Smaller but still bold and title case
         elif font_size >= 10 and is_bold:
-            if text[0].isupper() and len(text.split()) <= 25:
+            if starts_upper and word_count <= 25:
                 return 'H3'
         
         return None
     
     def calculate_font_statistics(self, pages_data: List[Dict]) -> Dict:
         """Calculate font statistics"""
-        sizes = []
+        stats = FontStatistics()
         for page_data in pages_data:
-            for line in page_data['lines']:
-                sizes.append(line['size'])
-        
-        if sizes:
-            avg_size = sum(sizes) / len(sizes)
-        else:
-            avg_size = 10
-        
-        return {'avg_font_size': avg_size}
+            stats.add_page(page_data)
+        return stats.context()
     
-    def extract_outline(self, pdf_path: str) -> Dict:
-        """Extract title and outline from PDF"""
+    def extract_outline(self, pdf: PDFSource) -> Dict:
+        """Extract title and outline from PDF (a path, or its bytes or a binary stream)"""
         try:
-            pages_data = self.extract_text_with_formatting(pdf_path)
-            
-            if not pages_data:
-                return {"title": "", "outline": []}
-            
-            # Extract title
+            return self._extract_outline(pdf)
+        except Exception as e:
+            print(f"Error processing {source_name(pdf)}: {str(e)}")
+            return {"title": "", "outline": []}
+
+    def _extract_outline(self, pdf: PDFSource) -> Dict:
+        """Extract title and outline from PDF, raising on failure"""
+        # A stream is read once here: the document may be opened more than once
+        pdf = read_source(pdf)
+        if not self.profile:
+            return self._extract_outline_cached(pdf)
+
+        self.profiler = StageProfiler(source_name(pdf))
+        try:
+            return self._extract_outline_cached(pdf)
+        finally:
+            self.profiler.finish()
+            self.last_profile = self.profiler
+            self.profiler = NULL_PROFILER
+            if self.on_profile is not None:
+                self.on_profile(self.last_profile)
+
+    def _extract_outline_cached(self, pdf: PDFSource) -> Dict:
+        self.last_cache_hit = None
+        if self.cache is None or not self.cache.enabled:
+            return self._extract_outline_uncached(pdf)
+
+        with self.profiler.stage('cache'):
+            key = self.cache.key(pdf, self.fingerprint())
+            result = self.cache.get(key)
+        self.last_cache_hit = result is not None
+        if result is None:
+            result = self._extract_outline_uncached(pdf)
+            with self.profiler.stage('cache'):
+                self.cache.put(key, result)
+        return result
+
+    def fingerprint(self) -> str:
+        """Version and the options that change extraction output"""
+        return f"v{EXTRACTOR_VERSION}:bookmarks={int(self.use_bookmarks)}"
+
+    def _extract_outline_uncached(self, pdf: PDFSource) -> Dict:
+        if self.use_bookmarks:
+            with self.profiler.stage('bookmarks'):
+                result = self._extract_outline_from_bookmarks(pdf)
+            if result is not None:
+                result["source"] = "bookmarks"
+                return result
+
+        result = self._extract_outline_from_layout(pdf)
+        if self.use_bookmarks:
+            result["source"] = "layout"
+        return result
+
+    def _extract_outline_from_layout(self, pdf: PDFSource) -> Dict:
+        """Extract title and outline from font and numbering heuristics"""
+        if self.columnar:
+            return self._extract_outline_columnar(pdf)
+        if self.streaming:
+            return self._extract_outline_streaming(pdf)
+
+        profiler = self.profiler
+        pages_data = self.extract_text_with_formatting(pdf)
+        
+        if not pages_data:
+            return {"title": "", "outline": []}
+        
+        # Extract title
+        with profiler.stage('title'):
             title = self.extract_title(pages_data)
-            title_parts = set(part.strip() for part in title.split() if len(part.strip()) > 2)
-            
-            # Calculate font statistics
+            title_parts = self._title_parts(title)
+        
+        # Calculate font statistics
+        with profiler.stage('statistics'):
             context = self.calculate_font_statistics(pages_data)
-            
-            # Extract headings
-            outline = []
-            seen_headings = set()
-            
+        
+        # Extract headings
+        outline = []
+        seen_headings = set()
+        
+        with profiler.stage('headings'):
             for page_data in pages_data:
-                page_num = page_data['page_num'] - 1  # Adjust page numbering to match expected output
-                if page_num <= 0:  # Skip page 0 or negative
+                self._collect_headings(page_data, title_parts, context, outline, seen_headings)
+        
+        return {
+            "title": title + '  ',  # Add trailing spaces like expected
+            "outline": outline
+        }
+
+    def _extract_outline_from_bookmarks(self, pdf: PDFSource) -> Optional[Dict]:
+        """Build the outline from the embedded bookmark tree.
+
+        Only the first page is decoded (for the title), so the cost does not
+        grow with the page count. Returns None when the document has no
+        bookmarks or they fail validate_bookmarks.
+        """
+        doc = open_pdf(pdf)
+        try:
+            toc = doc.get_toc(simple=True)
+            if not self.validate_bookmarks(toc, len(doc)):
+                return None
+
+            outline = []
+            for level, text, page in toc:
+                if level > MAX_BOOKMARK_LEVEL:
                     continue
-                
-                for line in page_data['lines']:
-                    text = line['text'].strip()
-                    if not text:
-                        continue
-                    
-                    # Skip if this text is part of the title (to avoid duplicates)
-                    if text.strip() in title_parts:
-                        continue
-                    
-                    level = self.is_heading(
-                        text, 
-                        line['size'], 
-                        line['flags'], 
-                        page_num, 
-                        context
-                    )
-                    
-                    if level:
-                        # Clean the text but preserve trailing spaces like expected output
-                        clean_text = text.strip() + ' '  # Add trailing space like expected
-                        
-                        # Avoid duplicates by checking exact match
-                        heading_key = (level, clean_text.strip())
-                        if heading_key not in seen_headings:
-                            outline.append({
-                                "level": level,
-                                "text": clean_text,
-                                "page": page_num
-                            })
-                            seen_headings.add(heading_key)
+                outline.append({
+                    "level": f"H{level}",
+                    "text": ' '.join(text.split()) + ' ',  # Add trailing space like expected
+                    "page": page - 1  # Same page numbering as the layout outline
+                })
+
+            title = self.extract_title([self._page_data(doc[0], 0)])
+        finally:
+            doc.close()
+
+        return {
+            "title": title + '  ',  # Add trailing spaces like expected
+            "outline": outline
+        }
+
+    def validate_bookmarks(self, toc: List[List], page_count: int) -> bool:
+        """Cheap plausibility checks on a get_toc(simple=True) result"""
+        if len(toc) < MIN_BOOKMARKS or toc[0][0] != 1:
+            return False
+
+        backwards = 0
+        previous_page = 0
+        for level, text, page in toc:
+            text = text.strip()
+            if not text or len(text) > 200:
+                return False
+            if page < 1 or page > page_count:  # unresolved or broken destination
+                return False
+            if page < previous_page:
+                backwards += 1
+            previous_page = page
+
+        # Bookmarks that jump around the document are unlikely to be an outline
+        if backwards > len(toc) // 4:
+            return False
+
+        # A tree where nearly every entry has the same text is auto-generated noise
+        distinct_texts = len(set(text.strip().lower() for _, text, _ in toc))
+        return distinct_texts * 2 > len(toc)
+
+    def _extract_outline_streaming(self, pdf: PDFSource) -> Dict:
+        """Extract title and outline holding only one page in memory at a time.
+
+        The title comes from the first page, which is never scanned for
+        headings, so every later page can be classified as soon as it is
+        decoded. Font statistics are kept as running aggregates and the
+        context passed to is_heading reflects the pages seen so far.
+        """
+        title = None
+        title_parts = set()
+        stats = FontStatistics()
+        outline = []
+        seen_headings = set()
+
+        profiler = self.profiler
+        for page_data in self.iter_pages(pdf):
+            with profiler.stage('statistics'):
+                stats.add_page(page_data)
+            if title is None:
+                with profiler.stage('title'):
+                    title = self.extract_title([page_data])
+                    title_parts = self._title_parts(title)
+            with profiler.stage('headings'):
+                self._collect_headings(page_data, title_parts, stats.context(), outline, seen_headings)
+
+        if title is None:
+            return {"title": "", "outline": []}
+
+        return {
+            "title": title + '  ',  # Add trailing spaces like expected
+            "outline": outline
+        }
+
+    def _extract_outline_columnar(self, pdf: PDFSource) -> Dict:
+        """Extract title and outline from a LineStore.
+
+        Pages are streamed into the column store, the size and flag thresholds
+        run as NumPy masks, and only the surviving lines go through the
+        text checks in is_heading.
+        """
+        store = LineStore.from_pages(self.iter_pages(pdf), _NUMBERED_HEADING_RE.match)
+        self.profiler.count('regex_evaluations', len(store))  # numbering prefix per line
+        if not store.page_count:
+            return {"title": "", "outline": []}
+
+        profiler = self.profiler
+        with profiler.stage('title'):
+            title = self._extract_title_columnar(store)
+            title_parts = self._title_parts(title)
+
+        with profiler.stage('statistics'):
+            mean_size = store.mean_size()
+            context = {'avg_font_size': mean_size if mean_size is not None else 10}
+
+        outline = []
+        seen_headings = set()
+        with profiler.stage('headings'):
+            sizes = store.sizes.tolist()
+            flags = store.flags.tolist()
+            pages = store.pages.tolist()
+            candidates = store.heading_candidates().tolist()
+
+            for index in candidates:
+                text = store.text(index)
+                if text in title_parts:
+                    continue
+                page_num = pages[index] - 1  # Adjust page numbering to match expected output
+                level = self.is_heading(text, sizes[index], flags[index], page_num, context)
+                if level:
+                    heading_key = (level, text)
+                    if heading_key not in seen_headings:
+                        outline.append({
+                            "level": level,
+                            "text": text + ' ',  # Add trailing space like expected
+                            "page": page_num
+                        })
+                        seen_headings.add(heading_key)
+
+        profiler.count('candidates', len(candidates))
+        profiler.count('headings', len(outline))
+
+        return {
+            "title": title + '  ',  # Add trailing spaces like expected
+            "outline": outline
+        }
+
+    def _extract_title_columnar(self, store) -> str:
+        """Same rules as extract_title, on the first-page rows of a LineStore"""
+        candidates = [
+            index for index in store.title_candidates().tolist()
+            if not re.match(r'^page\s+\d+', store.text(index).lower())
+        ]
+        if not candidates:
+            return ""
+
+        sizes = store.sizes[candidates]
+        max_size = sizes.max()
+        if max_size <= 0:
+            return ""
+        title_candidates = [store.text(index) for index, size in zip(candidates, sizes) if size == max_size]
+        return '  '.join(title_candidates).strip()  # Use double space like expected
+
+    def _title_parts(self, title: str) -> set:
+        return set(part.strip() for part in title.split() if len(part.strip()) > 2)
+
+    def _collect_headings(self, page_data: Dict, title_parts: set, context: Dict,
+                          outline: List[Dict], seen_headings: set):
+        """Append the headings found on one page to outline"""
+        page_num = page_data['page_num'] - 1  # Adjust page numbering to match expected output
+        if page_num <= 0:  # Skip page 0 or negative
+            return
+        
+        candidates = 0
+        headings = len(outline)
+        for line in page_data['lines']:
+            text = line['text'].strip()
+            if not text:
+                continue
             
-            return {
-                "title": title + '  ',  # Add trailing spaces like expected
-                "outline": outline
-            }
+            # Skip if this text is part of the title (to avoid duplicates)
+            if text.strip() in title_parts:
+                continue
             
-        except Exception as e:
-            print(f"Error processing {pdf_path}: {str(e)}")
-            return {"title": "", "outline": []}
+            candidates += 1
+            level = self.is_heading(
+                text, 
+                line['size'], 
+                line['flags'], 
+                page_num, 
+                context
+            )
+            
+            if level:
+                # Clean the text but preserve trailing spaces like expected output
+                clean_text = text.strip() + ' '  # Add trailing space like expected
+                
+                # Avoid duplicates by checking exact match
+                heading_key = (level, clean_text.strip())
+                if heading_key not in seen_headings:
+                    outline.append({
+                        "level": level,
+                        "text": clean_text,
+                        "page": page_num
+                    })
+                    seen_headings.add(heading_key)
+        
+        self.profiler.count('candidates', candidates)
+        self.profiler.count('headings', len(outline) - headings)
 
-def process_single_pdf(pdf_path: str, output_path: str):
-    """Process a single PDF file"""
-    extractor = PDFOutlineExtractor()
-    result = extractor.extract_outline(pdf_path)
-    
+
+class FontStatistics:
+    """Running font-size aggregates, updated one page at a time"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+
+    def add_page(self, page_data: Dict):
+        for line in page_data['lines']:
+            self.count += 1
+            self.total += line['size']
+
+    def context(self) -> Dict:
+        if self.count:
+            avg_size = self.total / self.count
+        else:
+            avg_size = 10
+        return {'avg_font_size': avg_size}
+
+
+def _extract_page_range(pdf: PDFSource, start: int, stop: int) -> List[Dict]:
+    """Decode pages [start, stop) of a PDF; runs in a page-range worker"""
+    extractor = PDFOutlineExtractor(page_workers=1)
+    doc = open_pdf(pdf)
+    try:
+        return [extractor._page_data(doc[page_num], page_num) for page_num in range(start, stop)]
+    finally:
+        doc.close()
+
+
+def write_outline(result: Dict, output_path: str):
+    """Write an outline result as JSON"""
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(result, f, indent=4, ensure_ascii=False)
+
+
+def trace_path(output_path: str) -> str:
+    """Path of the profiling trace written next to an output file"""
+    base = output_path[:-5] if output_path.lower().endswith('.json') else output_path
+    return base + '.trace.json'
+
+
+def process_single_pdf(pdf_path: str, output_path: str, extractor_options: Optional[Dict] = None):
+    """Process a single PDF file"""
+    extractor = PDFOutlineExtractor(**(extractor_options or {}))
+    result = extractor.extract_outline(pdf_path)
+    write_outline(result, output_path)
+    if extractor.last_profile is not None:
+        extractor.last_profile.write_json(trace_path(output_path))
     
     print(f"Processed: {pdf_path} -> {output_path}")
 
-def process_directory(input_dir: str, output_dir: str):
+
+class JobResult(NamedTuple):
+    pdf_path: str
+    error: Optional[str] = None
+    cache_hit: Optional[bool] = None  # None when no cache is configured
+
+
+# One extractor per pool worker, created by the pool initializer
+_worker_extractor = None
+
+
+def _init_worker(extractor_options: Optional[Dict] = None):
+    global _worker_extractor
+    _worker_extractor = PDFOutlineExtractor(**(extractor_options or {}))
+
+
+def _process_pdf_job(pdf_path: str, output_path: str) -> JobResult:
+    """Process one PDF inside a worker, keeping its failure separate"""
+    extractor = _worker_extractor or PDFOutlineExtractor()
+    try:
+        result = extractor._extract_outline(pdf_path)
+        error = None
+    except Exception as e:
+        result = {"title": "", "outline": []}
+        error = str(e)
+    try:
+        write_outline(result, output_path)
+        if extractor.profile and extractor.last_profile is not None:
+            extractor.last_profile.write_json(trace_path(output_path))
+    except Exception as e:
+        error = error or str(e)
+    return JobResult(pdf_path, error, extractor.last_cache_hit)
+
+
+def output_name(filename: str) -> str:
+    """JSON output name of a PDF input name (a.pdf and a.PDF both give a.json)"""
+    return filename[:-4] + '.json'
+
+
+def output_collisions(filenames: List[str]) -> Dict[str, str]:
+    """Error message for each input whose output name another input also maps to"""
+    by_output = {}
+    for filename in filenames:
+        by_output.setdefault(output_name(filename), []).append(filename)
+    errors = {}
+    for name, inputs in by_output.items():
+        if len(inputs) > 1:
+            for filename in inputs:
+                errors[filename] = f"output {name} collides with {', '.join(f for f in inputs if f != filename)}"
+    return errors
+
+
+def list_pdf_jobs(input_dir: str, output_dir: str) -> Tuple[List[Tuple[str, str]], List[JobResult]]:
+    """
+    (pdf_path, output_path) pairs for the PDFs in input_dir, sorted by name,
+    and failed results for PDFs whose output names collide
+    """
+    filenames = [filename for filename in sorted(os.listdir(input_dir)) if filename.lower().endswith('.pdf')]
+    collisions = output_collisions(filenames)
+    jobs = []
+    for filename in filenames:
+        if filename not in collisions:
+            jobs.append((os.path.join(input_dir, filename), os.path.join(output_dir, output_name(filename))))
+    return jobs, [JobResult(os.path.join(input_dir, filename), error) for filename, error in collisions.items()]
+
+
+def run_jobs(jobs: List[Tuple[str, str]], workers: Optional[int] = None,
+             extractor_options: Optional[Dict] = None) -> List[JobResult]:
+    """
+    Run PDF jobs, in a process pool when workers > 1; results keep job order.
+    Pool workers decode large PDFs serially unless page_workers is set.
+    """
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(jobs)) or 1
+
+    if workers == 1:
+        _init_worker(extractor_options)
+        return [_process_pdf_job(pdf_path, output_path) for pdf_path, output_path in jobs]
+
+    # Files already run in parallel; page-range pools inside workers would
+    # oversubscribe (workers x page_workers processes), unless asked for
+    extractor_options = dict(extractor_options or {})
+    if extractor_options.get('page_workers') is None:
+        extractor_options['page_workers'] = 1
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(extractor_options,)) as pool:
+        futures = [pool.submit(_process_pdf_job, pdf_path, output_path) for pdf_path, output_path in jobs]
+        results = []
+        for (pdf_path, _), future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:  # worker crashed (e.g. killed by the OS)
+                results.append(JobResult(pdf_path, f"worker failed: {e}"))
+        return results
+
+
+def print_summary(results: List[JobResult]):
+    """Print an ordered per-file summary followed by totals"""
+    failed = 0
+    for pdf_path, error, _ in results:
+        if error is None:
+            print(f"Processed: {pdf_path}")
+        else:
+            failed += 1
+            print(f"Failed: {pdf_path}: {error}")
+    print(f"Done: {len(results) - failed} processed, {failed} failed")
+
+    cached = [result.cache_hit for result in results if result.cache_hit is not None]
+    if cached:
+        hits = sum(cached)
+        print(f"Cache: {hits} hits, {len(cached) - hits} misses")
+
+
+def process_directory(input_dir: str, output_dir: str, workers: Optional[int] = None,
+                      extractor_options: Optional[Dict] = None):
     """Process all PDF files in input directory"""
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    for filename in os.listdir(input_dir):
-        if filename.lower().endswith('.pdf'):
-            pdf_path = os.path.join(input_dir, filename)
-            json_filename = filename[:-4] + '.json'
-            output_path = os.path.join(output_dir, json_filename)
-            
-            process_single_pdf(pdf_path, output_path)
+    jobs, collided = list_pdf_jobs(input_dir, output_dir)
+    results = run_jobs(jobs, workers, extractor_options) + collided
+    print_summary(results)
+    return results
+
+
+MANIFEST_NAME = '.manifest.json'
+
+
+def load_manifest(output_dir: str) -> Dict:
+    """Load the incremental-sync manifest of an output directory"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'fingerprint': None, 'files': {}}
+
+
+def save_manifest(output_dir: str, manifest: Dict):
+    """Write the manifest atomically so an interrupted run leaves the old one intact"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def sync_directory(input_dir: str, output_dir: str, workers: Optional[int] = None,
+                   extractor_options: Optional[Dict] = None, min_age: float = 0,
+                   report_idle: bool = True) -> List[JobResult]:
+    """
+    Process only PDFs that are new or changed since the last sync.
+
+    The manifest in output_dir maps each input file to its size, mtime,
+    content hash and output file. Files whose size and mtime match are
+    skipped without being read; files that were touched but hash the same
+    are skipped too. Outputs (and traces) of deleted inputs are removed, and
+    a change of extractor options reprocesses everything. Files modified
+    less than min_age seconds ago are left for a later run (they may still
+    be copying). Inputs whose output names collide (a.pdf and a.PDF) fail
+    without being processed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    fingerprint = PDFOutlineExtractor(**(extractor_options or {})).fingerprint()
+    if manifest.get('fingerprint') != fingerprint:
+        manifest = {'fingerprint': fingerprint, 'files': {}}
+    entries = manifest['files']
+
+    now = time.time()
+    seen = set()
+    jobs = []
+    pending = {}
+    unchanged = 0
+
+    inputs = [entry for entry in sorted(os.scandir(input_dir), key=lambda e: e.name)
+              if entry.name.lower().endswith('.pdf') and entry.is_file()]
+    collisions = output_collisions([entry.name for entry in inputs])
+    collided = []
+
+    for entry in inputs:
+        seen.add(entry.name)
+        if entry.name in collisions:
+            collided.append(JobResult(entry.path, collisions[entry.name]))
+            continue
+        stat = entry.stat()
+        if now - stat.st_mtime < min_age:
+            continue
+
+        output_path = os.path.join(output_dir, output_name(entry.name))
+        known = entries.get(entry.name)
+        if known and os.path.exists(output_path):
+            if known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+                unchanged += 1
+                continue
+            digest = file_sha256(entry.path)
+            if known['sha256'] == digest:
+                known['size'], known['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+                unchanged += 1
+                continue
+        else:
+            digest = file_sha256(entry.path)
+
+        jobs.append((entry.path, output_path))
+        pending[entry.path] = (entry.name, {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': digest,
+            'output': os.path.basename(output_path),
+        })
+
+    removed = 0
+    for name in [name for name in entries if name not in seen]:
+        output_path = os.path.join(output_dir, entries.pop(name)['output'])
+        for path in (output_path, trace_path(output_path)):
+            if os.path.exists(path):
+                os.remove(path)
+        removed += 1
+
+    results = run_jobs(jobs, workers, extractor_options) if jobs else []
+    for result in results:
+        name, entry = pending[result.pdf_path]
+        if result.error is None:
+            entries[name] = entry
+        else:
+            entries.pop(name, None)  # retry on the next sync
+    results += collided
+
+    if jobs or removed or not os.path.exists(os.path.join(output_dir, MANIFEST_NAME)):
+        save_manifest(output_dir, manifest)
+
+    if results:
+        print_summary(results)
+    if jobs or removed or report_idle:
+        print(f"Sync: {len(jobs)} new or changed, {unchanged} unchanged, {removed} removed")
+    return results
+
+
+def watch_directory(input_dir: str, output_dir: str, workers: Optional[int] = None,
+                    extractor_options: Optional[Dict] = None, interval: float = 2.0):
+    """Poll input_dir and sync new or changed PDFs until interrupted"""
+    print(f"Watching {input_dir} every {interval:g}s (Ctrl+C to stop)")
+    try:
+        while True:
+            # Skip files written during the last interval; they may still be copying
+            sync_directory(input_dir, output_dir, workers, extractor_options,
+                           min_age=interval, report_idle=False)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+
+
+def add_extractor_arguments(parser: argparse.ArgumentParser):
+    """Command-line options shared by every entry point that builds a PDFOutlineExtractor"""
+    parser.add_argument("--page-workers", type=int, default=None,
+                        help="Worker processes for page ranges of large PDFs (default: CPU count, 1 disables)")
+    parser.add_argument("--page-threshold", type=int, default=PARALLEL_PAGE_THRESHOLD,
+                        help="Page count from which a PDF is split into parallel page ranges")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Decode one page at a time to keep memory flat on long documents")
+    parser.add_argument("--bookmarks", action="store_true",
+                        help="Use embedded bookmarks when present and plausible, recording the path in 'source'")
+    parser.add_argument("--columnar", action="store_true",
+                        help="Store lines in NumPy columns and filter them with vectorized masks")
+    parser.add_argument("--trace", action="store_true",
+                        help="Write per-stage timings and counters as <name>.trace.json next to each output")
+    parser.add_argument("--cache-dir", default=os.environ.get("OUTLINE_CACHE_DIR"),
+                        help="Directory of the outline result cache (default: $OUTLINE_CACHE_DIR, none if unset)")
+    parser.add_argument("--cache-max-mb", type=int, default=256,
+                        help="Size limit of the outline cache in MB")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the outline cache")
+    parser.add_argument("--ir-cache-dir", default=os.environ.get("PDF_IR_CACHE_DIR"),
+                        help="Directory of decoded span IR files shared with the 1B parser "
+                             "(default: $PDF_IR_CACHE_DIR, none if unset)")
+
+
+def extractor_options_from_args(args: argparse.Namespace) -> Dict:
+    """PDFOutlineExtractor keyword arguments from add_extractor_arguments options"""
+    extractor_options = {
+        'streaming': args.streaming,
+        'columnar': args.columnar,
+        'use_bookmarks': args.bookmarks,
+        'page_workers': args.page_workers,
+        'parallel_page_threshold': args.page_threshold,
+        'profile': args.trace,
+    }
+    if args.cache_dir and not args.no_cache:
+        extractor_options['cache'] = OutlineCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+    if args.ir_cache_dir:
+        extractor_options['ir_cache'] = IRCache(args.ir_cache_dir)
+    return extractor_options
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract title and outline from PDFs")
+    parser.add_argument("input", nargs="?", default="/app/input", help="PDF file or input directory")
+    parser.add_argument("output", nargs="?", default="/app/output", help="JSON file or output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes for directory mode (default: CPU count)")
+    add_extractor_arguments(parser)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Process only new or changed PDFs and remove outputs of deleted ones")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep polling the input directory and process PDFs as they arrive")
+    parser.add_argument("--interval", type=float, default=2.0, help="Polling interval for --watch in seconds")
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
-    if len(sys.argv) == 3:
-        pdf_path = sys.argv[1]
-        output_path = sys.argv[2]
-        process_single_pdf(pdf_path, output_path)
+    args = parse_args()
+    extractor_options = extractor_options_from_args(args)
+    if os.path.isfile(args.input):
+        process_single_pdf(args.input, args.output, extractor_options)
+    elif args.watch:
+        watch_directory(args.input, args.output, args.workers, extractor_options, args.interval)
+    elif args.incremental:
+        sync_directory(args.input, args.output, args.workers, extractor_options)
     else:
-        input_dir = "/app/input"
-        output_dir = "/app/output"
-        process_directory(input_dir, output_dir)
+        process_directory(args.input, args.output, args.workers, extractor_options)
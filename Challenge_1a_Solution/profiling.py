@@ -0,0 +1,68 @@
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Dict
+
+
+class StageProfiler:
+    """
+    Wall time per stage and event counters for one document.
+
+    Stages are accumulated, so a stage entered once per page (decode) adds up
+    over the document. Counters are plain integers keyed by name.
+    """
+
+    enabled = True
+
+    def __init__(self, document: str = ""):
+        self.document = document
+        self.stages = defaultdict(float)
+        self.counts = defaultdict(int)
+        self._start = time.perf_counter()
+        self.total_seconds = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def count(self, name: str, n: int = 1):
+        self.counts[name] += n
+
+    def finish(self):
+        self.total_seconds = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict:
+        return {
+            'document': self.document,
+            'total_seconds': round(self.total_seconds, 6) if self.total_seconds is not None else None,
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            'counts': dict(self.counts),
+        }
+
+    def write_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=4, ensure_ascii=False)
+
+
+class NullProfiler:
+    """Profiler used when profiling is off; every call is a no-op"""
+
+    enabled = False
+    _null_stage = nullcontext()
+
+    def stage(self, name: str):
+        return self._null_stage
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,251 @@
+"""
+Resident outline extraction service.
+
+Keeps a pool of warm worker processes, each with its own PDFOutlineExtractor,
+and accepts jobs as JSON lines, either on stdin (responses on stdout) or on a
+local Unix socket (responses on the same connection):
+
+    {"id": 1, "input": "/app/input/a.pdf", "output": "/app/output/a.json"}
+    {"id": 2, "input": "/app/input/b.pdf"}
+
+A job with "output" writes the outline there; without it the outline is
+returned inline as "result". Every job gets one response line:
+
+    {"id": 1, "ok": true, "output": "/app/output/a.json", "cache_hit": null, "seconds": 0.041}
+
+Responses are written as jobs finish, so they may arrive out of order; use
+"id" to match them. Throughput stats are printed to stderr on shutdown
+(EOF on stdin, SIGINT or SIGTERM).
+
+    python worker_service.py --jobs 4 < jobs.jsonl
+    python worker_service.py --socket /tmp/outline.sock --jobs 4
+"""
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+try:
+    from .process_pdfs import (PDFOutlineExtractor, add_extractor_arguments, extractor_options_from_args,
+                               write_outline, trace_path)
+except ImportError:
+    from process_pdfs import (PDFOutlineExtractor, add_extractor_arguments, extractor_options_from_args,
+                              write_outline, trace_path)
+
+# Extractor of this worker process, created once by the pool initializer
+_extractor = None
+
+
+def _init_service_worker(extractor_options: Optional[Dict] = None):
+    global _extractor
+    _extractor = PDFOutlineExtractor(**(extractor_options or {}))
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def run_job(job: Dict) -> Dict:
+    """Run one job inside a worker process and build its response"""
+    start = time.perf_counter()
+    response = {'id': job.get('id')}
+    try:
+        result = _extractor._extract_outline(job['input'])
+        output_path = job.get('output')
+        if output_path:
+            write_outline(result, output_path)
+            if _extractor.last_profile is not None:
+                _extractor.last_profile.write_json(trace_path(output_path))
+            response['output'] = output_path
+        else:
+            response['result'] = result
+        response['ok'] = True
+        response['cache_hit'] = _extractor.last_cache_hit
+    except Exception as e:
+        response['ok'] = False
+        response['error'] = str(e)
+    response['seconds'] = round(time.perf_counter() - start, 4)
+    return response
+
+
+class OutlineService:
+    """Warm process pool that runs outline jobs and keeps throughput stats"""
+
+    def __init__(self, jobs: int, extractor_options: Optional[Dict] = None):
+        self.jobs = jobs
+        self.pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_service_worker,
+                                        initargs=(extractor_options,))
+        # Bound the jobs queued in the pool; readers block once it is full
+        self._slots = threading.BoundedSemaphore(jobs * 2)
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.completed = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self.job_seconds = 0.0
+
+    def warm_up(self):
+        """Start every worker process (and import PyMuPDF there) before the first job"""
+        wait([self.pool.submit(_ping) for _ in range(self.jobs)])
+
+    def submit(self, line: str, respond: Callable[[Dict], None]):
+        """Parse one JSON job line and run it; respond is called with the response"""
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict) or not job.get('input'):
+                raise ValueError("a job needs an 'input' path")
+        except ValueError as e:
+            self._record({'ok': False})
+            respond({'id': None, 'ok': False, 'error': f"invalid job: {e}"})
+            return
+
+        self._slots.acquire()
+        try:
+            future = self.pool.submit(run_job, job)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda done: self._finish(done, job, respond))
+
+    def _finish(self, future, job: Dict, respond: Callable[[Dict], None]):
+        self._slots.release()
+        try:
+            response = future.result()
+        except Exception as e:  # worker process died
+            response = {'id': job.get('id'), 'ok': False, 'error': f"worker failed: {e}"}
+        self._record(response)
+        respond(response)
+
+    def _record(self, response: Dict):
+        with self._lock:
+            if response.get('ok'):
+                self.completed += 1
+            else:
+                self.failed += 1
+            if response.get('cache_hit'):
+                self.cache_hits += 1
+            self.job_seconds += response.get('seconds', 0)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+    def stats(self) -> Dict:
+        uptime = time.perf_counter() - self.started
+        total = self.completed + self.failed
+        return {
+            'jobs': total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'cache_hits': self.cache_hits,
+            'uptime_seconds': round(uptime, 3),
+            'jobs_per_second': round(total / uptime, 3) if uptime else None,
+            'mean_job_seconds': round(self.job_seconds / total, 4) if total else None,
+            'concurrency': self.jobs,
+        }
+
+
+def serve_stdin(service: OutlineService):
+    """Read jobs from stdin until EOF, writing responses to stdout"""
+    out_lock = threading.Lock()
+
+    def respond(response: Dict):
+        with out_lock:
+            sys.stdout.write(json.dumps(response, ensure_ascii=False) + '\n')
+            sys.stdout.flush()
+
+    for line in sys.stdin:
+        if line.strip():
+            service.submit(line, respond)
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    """One client connection: JSON job lines in, JSON response lines out"""
+
+    def handle(self):
+        out_lock = threading.Lock()
+        outstanding = threading.Condition()
+        pending = [0]
+
+        def respond(response: Dict):
+            with out_lock:
+                try:
+                    self.wfile.write((json.dumps(response, ensure_ascii=False) + '\n').encode('utf-8'))
+                    self.wfile.flush()
+                except OSError:  # client went away
+                    pass
+            with outstanding:
+                pending[0] -= 1
+                outstanding.notify_all()
+
+        for raw in self.rfile:
+            line = raw.decode('utf-8', errors='replace')
+            if not line.strip():
+                continue
+            with outstanding:
+                pending[0] += 1
+            self.server.service.submit(line, respond)
+
+        # Keep the connection open until every job sent on it has answered
+        with outstanding:
+            outstanding.wait_for(lambda: pending[0] == 0)
+
+
+class _UnixJobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_socket(service: OutlineService, socket_path: str):
+    """Accept jobs on a Unix socket until interrupted"""
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = _UnixJobServer(socket_path, _JobHandler)
+    server.service = service
+    print(f"Listening on {socket_path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resident outline extraction worker")
+    parser.add_argument("--socket", help="Unix socket path to listen on (default: read jobs from stdin)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of concurrent jobs (worker processes, default: CPU count)")
+    add_extractor_arguments(parser)
+    args = parser.parse_args(argv)
+
+    extractor_options = extractor_options_from_args(args)
+    # Jobs already run in parallel; page-range pools inside workers would oversubscribe
+    if args.page_workers is None:
+        extractor_options['page_workers'] = 1
+
+    service = OutlineService(args.jobs, extractor_options)
+    service.warm_up()
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    try:
+        if args.socket:
+            serve_socket(service, args.socket)
+        else:
+            serve_stdin(service)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+        print(json.dumps({'worker_stats': service.stats()}), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
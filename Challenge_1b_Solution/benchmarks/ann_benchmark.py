@@ -0,0 +1,86 @@
+"""
+Recall and latency of the IVF index against exact search.
+
+Builds an IVFIndex over synthetic clustered embeddings (or an .npy file of
+real ones from encode_texts), then times exact top-k search and IVF search
+at several nprobe values and reports recall@k against the exact results.
+
+    python benchmarks/ann_benchmark.py --size 300000 --nprobe 1 8 32
+    python benchmarks/ann_benchmark.py --embeddings sections.npy
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+from src.ann_index import IVFIndex  # noqa: E402
+from src.ranker import score_matrix, select_top_k  # noqa: E402
+
+
+def synthetic_embeddings(size: int, dim: int, clusters: int, noise_scale: float = 1.5, seed: int = 0) -> np.ndarray:
+    """Normalized points around random topic centres, like section embeddings"""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    noise = rng.normal(scale=noise_scale, size=(size, dim)).astype(np.float32)
+    points = centres[rng.integers(0, clusters, size)] + noise
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF index recall vs latency against exact search")
+    parser.add_argument("--embeddings", type=str, help="Section embeddings (.npy) instead of synthetic data")
+    parser.add_argument("--size", type=int, default=100000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="Synthetic embedding dimension")
+    parser.add_argument("--clusters", type=int, default=1000, help="Topic clusters in the synthetic corpus")
+    parser.add_argument("--noise", type=float, default=1.5, help="Spread of the synthetic clusters")
+    parser.add_argument("--queries", type=int, default=100, help="Number of queries")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--nprobe", type=int, nargs="*", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    if args.embeddings:
+        corpus = np.load(args.embeddings).astype(np.float32)
+    else:
+        corpus = synthetic_embeddings(args.size, args.dim, args.clusters, args.noise)
+    rng = np.random.default_rng(1)
+    queries = corpus[rng.choice(len(corpus), args.queries, replace=False)]
+    queries = queries + rng.normal(scale=0.02, size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    index = IVFIndex(corpus.shape[1])
+    index.add(corpus, [str(i) for i in range(len(corpus))])
+    build_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index.save(tmp)
+        start = time.perf_counter()
+        index = IVFIndex.load(tmp)
+        index.search(queries[:1], k=args.k)
+        load_seconds = time.perf_counter() - start
+
+        # One query at a time, as the IVF search processes them
+        start = time.perf_counter()
+        exact = [select_top_k(score_matrix(query, corpus), args.k)[0] for query in queries]
+        exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        exact_sets = [set(row.tolist()) for row in exact]
+
+        print(f"corpus {corpus.shape[0]} x {corpus.shape[1]}, nlist {index.nlist}, "
+              f"build {build_seconds:.2f}s, lazy load + first query {load_seconds * 1000:.1f} ms")
+        print(f"{'search':<12} {'ms/query':>9} {'recall@' + str(args.k):>10}")
+        print(f"{'exact':<12} {exact_ms:>9.2f} {1.0:>10.3f}")
+        for nprobe in args.nprobe:
+            start = time.perf_counter()
+            results = index.search(queries, k=args.k, nprobe=nprobe)
+            ms = (time.perf_counter() - start) * 1000 / len(queries)
+            hits = sum(len(expected & {int(key) for key, _ in found}) for expected, found in zip(exact_sets, results))
+            print(f"{'nprobe=' + str(nprobe):<12} {ms:>9.2f} {hits / (len(queries) * args.k):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
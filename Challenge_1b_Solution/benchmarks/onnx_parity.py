@@ -0,0 +1,115 @@
+"""
+Parity and speed check of the int8 ONNX embedding backend against PyTorch.
+
+Encodes the sections of every sample collection with both backends, each in
+a fresh process, and compares the cosine scores of the persona/task query
+against every section. Exits 1 if any score differs by more than the
+tolerance, so it can gate a re-export or a dependency upgrade.
+
+    python -m src.onnx_backend
+    python benchmarks/onnx_parity.py --threads 4
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+from src.parser import parse_documents  # noqa: E402
+
+# Same filter as main.py
+MIN_TEXT_LEN = 100
+SCORE_TOLERANCE = 0.02
+
+
+def load_collection(collection_dir: str) -> Dict:
+    with open(os.path.join(collection_dir, "challenge1b_input.json"), "r") as f:
+        input_data = json.load(f)
+    filenames = [doc["filename"] for doc in input_data["documents"]]
+    parsed = parse_documents(os.path.join(collection_dir, "PDFs"), filenames)
+    texts = [page["text"] for pages in parsed.values() for page in pages if len(page["text"]) >= MIN_TEXT_LEN]
+    query = f"{input_data['persona']['role'].strip()}: {input_data['job_to_be_done']['task'].strip()}"
+    return {"name": os.path.basename(collection_dir), "query": query, "texts": texts}
+
+
+def encode_case(options: Dict, queries: List[str], texts: List[List[str]]) -> Dict:
+    """Loads one backend and encodes every collection; runs in its own process"""
+    from src import embedder
+
+    start = time.perf_counter()
+    embedder.load_model(**options)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    query_embeddings = embedder.encode_texts(queries)
+    section_embeddings = [embedder.encode_texts(collection) for collection in texts]
+    encode_seconds = time.perf_counter() - start
+
+    return {
+        "load_seconds": load_seconds,
+        "encode_seconds": encode_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "queries": query_embeddings,
+        "sections": section_embeddings,
+    }
+
+
+def run_isolated(options: Dict, queries: List[str], texts: List[List[str]]) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(encode_case, options, queries, texts).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ONNX int8 embeddings with the PyTorch backend")
+    parser.add_argument("--model", type=str, default="all-MiniLM-L6-v2", help="SentenceTransformer name or path")
+    parser.add_argument("--onnx_model", type=str, help="Exported ONNX model directory (default: models/<model>-onnx)")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads for both backends")
+    parser.add_argument("--tolerance", type=float, default=SCORE_TOLERANCE,
+                        help="Largest allowed absolute difference of a cosine score")
+    parser.add_argument("--collections", type=str, nargs="*",
+                        default=sorted(glob.glob(os.path.join(ROOT, "Challenge_1b", "Collection *"))),
+                        help="Collection directories to encode")
+    args = parser.parse_args()
+
+    collections = [load_collection(path) for path in args.collections]
+    queries = [collection["query"] for collection in collections]
+    texts = [collection["texts"] for collection in collections]
+
+    reference = run_isolated({"model_name": args.model, "threads": args.threads}, queries, texts)
+    candidate = run_isolated({"model_name": args.model, "backend": "onnx", "onnx_dir": args.onnx_model,
+                              "threads": args.threads}, queries, texts)
+
+    worst = 0.0
+    print(f"{'collection':<16} {'sections':>8} {'max |Δscore|':>13} {'top-5 overlap':>14}")
+    for i, collection in enumerate(collections):
+        expected = reference["sections"][i] @ reference["queries"][i]
+        actual = candidate["sections"][i] @ candidate["queries"][i]
+        delta = float(np.abs(expected - actual).max()) if len(expected) else 0.0
+        top_n = min(5, len(expected))
+        overlap = len(set(np.argsort(-expected)[:top_n]) & set(np.argsort(-actual)[:top_n]))
+        worst = max(worst, delta)
+        print(f"{collection['name']:<16} {len(expected):>8} {delta:>13.4f} {overlap:>11}/{top_n}")
+
+    print(f"\n{'backend':<8} {'load s':>8} {'encode s':>9} {'peak RSS MB':>12}")
+    for name, result in (("torch", reference), ("onnx", candidate)):
+        print(f"{name:<8} {result['load_seconds']:>8.2f} {result['encode_seconds']:>9.2f} {result['peak_rss_mb']:>12.1f}")
+    print(f"Speedup: {reference['encode_seconds'] / candidate['encode_seconds']:.2f}x")
+
+    if worst > args.tolerance:
+        print(f"FAIL: max score difference {worst:.4f} > {args.tolerance}")
+        sys.exit(1)
+    print(f"OK: max score difference {worst:.4f} <= {args.tolerance}")
+
+
+if __name__ == "__main__":
+    main()
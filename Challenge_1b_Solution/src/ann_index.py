@@ -0,0 +1,379 @@
+"""
+Approximate nearest-neighbour search over section embeddings.
+
+IVFIndex is an inverted-file index in pure NumPy: spherical k-means splits
+the (L2-normalized) embeddings into nlist clusters, and a query only scores
+the sections of its nprobe closest clusters. nprobe is the recall/latency
+knob: nprobe == nlist is an exact search.
+
+Every vector is added with a string key, so a saved index can be reopened
+and extended with only the sections it does not have yet. An index records
+the model its vectors came from, and is rebuilt rather than extended when a
+different model (or backend) is loaded.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Container, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .ranker import select_top_k
+except ImportError:
+    from ranker import select_top_k
+
+# Index directory created next to a collection's PDFs
+INDEX_DIR_NAME = "ann_index"
+META_NAME = "meta.json"
+# Files of one saved version, kept together in a generation directory
+INDEX_FILES = ("centroids.npy", "vectors.npy", "assignments.npy", "keys.json")
+# Generation directories still being written are named <id><TMP_SUFFIX>;
+# abandoned ones are removed after this many seconds
+TMP_SUFFIX = ".tmp"
+STALE_TMP_SECONDS = 3600
+DEFAULT_NPROBE = 8
+# Below this many vectors the index stays a single list (exact search)
+MIN_TRAIN_SIZE = 256
+# k-means runs on at most this many points per cluster
+TRAIN_POINTS_PER_LIST = 64
+# Retrain once the index has grown this many times past its training size
+RETRAIN_FACTOR = 4
+
+
+class IVFIndex:
+    """
+    Inverted-file index for inner-product (cosine) search.
+
+    Saved indexes are opened lazily: load() reads only the metadata and the
+    centroids, and the vectors are memory-mapped on the first search.
+
+    Rows are stored grouped by cluster, so a probed cluster is one contiguous
+    slice of the vectors. Rows added since the last train() or save() are
+    kept at the end and gathered by index until the next save().
+
+    save() writes every file of a version into a new generation directory
+    and then points meta.json at it, so a reader never mixes files of two
+    versions. The previous generation is kept for indexes opened before the
+    switch.
+    """
+
+    def __init__(self, dim: int, nprobe: int = DEFAULT_NPROBE, model_id: Optional[str] = None):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.model_id = model_id
+        self.centroids = np.zeros((1, dim), dtype=np.float32)
+        self.trained_size = 0
+        self.directory = None
+        self.generation = None
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._keys = []
+        self._grouped = 0
+        self._key_set = None
+        self._lists = None
+        self._loaded = True
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._keys)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def missing(self, keys: Sequence[str]) -> List[int]:
+        """Positions of the keys that are not in the index yet"""
+        self._ensure_loaded()
+        if self._key_set is None:
+            self._key_set = set(self._keys)
+        return [position for position, key in enumerate(keys) if key not in self._key_set]
+
+    def add(self, vectors: np.ndarray, keys: Sequence[str]):
+        """
+        Adds vectors under their keys (a key repeated within the call keeps
+        its last vector; keys already in the index are rejected, see
+        missing()). Before the first training, and whenever the index has
+        grown RETRAIN_FACTOR times past its training size, the clusters are
+        retrained over every vector; otherwise new vectors join their closest
+        existing cluster.
+        """
+        self._ensure_loaded()
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) != len(keys):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(keys)} keys")
+        last = {key: position for position, key in enumerate(keys)}
+        if len(last) < len(keys):
+            positions = sorted(last.values())
+            vectors, keys = vectors[positions], [keys[i] for i in positions]
+        present = len(keys) - len(self.missing(keys))
+        if present:
+            raise ValueError(f"{present} of the keys are already in the index")
+
+        self._vectors = np.concatenate([np.asarray(self._vectors), vectors])
+        self._keys.extend(keys)
+        self._key_set = None
+        self._lists = None
+
+        size = len(self._keys)
+        if size >= MIN_TRAIN_SIZE and (not self.trained_size or size >= RETRAIN_FACTOR * self.trained_size):
+            self.train()
+        else:
+            self._assignments = np.concatenate([np.asarray(self._assignments), self._assign(vectors)])
+
+    def train(self, nlist: Optional[int] = None, iterations: int = 10, seed: int = 0):
+        """Clusters every vector with spherical k-means (default nlist: sqrt of the size)"""
+        self._ensure_loaded()
+        vectors = np.asarray(self._vectors)
+        nlist = nlist or max(1, int(np.sqrt(len(vectors))))
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(len(vectors), nlist * TRAIN_POINTS_PER_LIST)
+        sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(labels, minlength=nlist)
+            order = np.argsort(labels, kind="stable")
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums = np.zeros_like(centroids)
+            filled = counts > 0
+            sums[filled] = np.add.reduceat(sample[order], starts[filled])
+            # Empty clusters restart from a random sample point
+            empty = ~filled
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+        self.centroids = centroids.astype(np.float32)
+        self.trained_size = len(vectors)
+        self._assignments = self._assign(vectors)
+        self._group()
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        keys: Optional[Container[str]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        The k best (key, score) pairs for each query, best first, scoring only
+        the sections of the nprobe clusters closest to the query.
+
+        keys: only rows under these keys are candidates (default: every row)
+        """
+        self._ensure_loaded()
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        vectors = self._vectors
+        offsets, tail_order, tail_offsets = self._inverted_lists()
+
+        results = []
+        probes = select_top_k(queries @ self.centroids.T, nprobe)
+        for query, probe in zip(queries, probes):
+            rows, scores = [], []
+            for c in probe:
+                start, stop = offsets[c], offsets[c + 1]
+                if stop > start:
+                    rows.append(np.arange(start, stop))
+                    scores.append(vectors[start:stop] @ query)
+                tail = tail_order[tail_offsets[c]:tail_offsets[c + 1]]
+                if len(tail):
+                    rows.append(tail)
+                    scores.append(vectors[tail] @ query)
+            if not rows:
+                results.append([])
+                continue
+            rows, scores = np.concatenate(rows), np.concatenate(scores)
+            if keys is not None:
+                wanted = np.fromiter((self._keys[row] in keys for row in rows), dtype=bool, count=len(rows))
+                rows, scores = rows[wanted], scores[wanted]
+                if not len(rows):
+                    results.append([])
+                    continue
+            best = select_top_k(scores, k)[0]
+            results.append([(self._keys[rows[i]], float(scores[i])) for i in best])
+        return results
+
+    def save(self, directory: str):
+        """
+        Writes the index to a new generation directory, then switches
+        meta.json to it and removes the generations before the previous one
+        """
+        self._ensure_loaded()
+        if self._grouped < len(self._keys):
+            self._group()
+        os.makedirs(directory, exist_ok=True)
+        generation = uuid.uuid4().hex[:16]
+        tmp_dir = os.path.join(directory, generation + TMP_SUFFIX)
+        os.makedirs(tmp_dir)
+        try:
+            np.save(os.path.join(tmp_dir, "centroids.npy"), self.centroids)
+            np.save(os.path.join(tmp_dir, "vectors.npy"), np.asarray(self._vectors))
+            np.save(os.path.join(tmp_dir, "assignments.npy"), np.asarray(self._assignments))
+            _write_json(os.path.join(tmp_dir, "keys.json"), self._keys)
+            os.rename(tmp_dir, os.path.join(directory, generation))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        previous = _read_meta(directory).get("generation", "") if self.exists(directory) else None
+        _write_json(os.path.join(directory, META_NAME), {
+            "dim": self.dim,
+            "model_id": self.model_id,
+            "nprobe": self.nprobe,
+            "size": len(self._keys),
+            "trained_size": self.trained_size,
+            "generation": generation,
+        })
+        self.directory = directory
+        self.generation = generation
+        _remove_old_generations(directory, keep={generation, previous})
+
+    @classmethod
+    def load(cls, directory: str) -> "IVFIndex":
+        meta = _read_meta(directory)
+        index = cls(meta["dim"], nprobe=meta["nprobe"], model_id=meta.get("model_id"))
+        index.directory = directory
+        index.generation = meta.get("generation", "")  # "": files directly in directory
+        index.centroids = np.load(index._path("centroids.npy"))
+        index.trained_size = meta["trained_size"]
+        index._loaded = False
+        return index
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, META_NAME))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, self.generation, name)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        try:
+            vectors = np.load(self._path("vectors.npy"), mmap_mode="r")
+            assignments = np.load(self._path("assignments.npy"))
+            with open(self._path("keys.json"), "r", encoding="utf-8") as f:
+                keys = json.load(f)
+        except FileNotFoundError:
+            # Two saves since load() removed this generation: open the current one whole
+            current = IVFIndex.load(self.directory)
+            if current.generation == self.generation:
+                raise
+            self.nprobe, self.generation = current.nprobe, current.generation
+            self.centroids, self.trained_size = current.centroids, current.trained_size
+            self._ensure_loaded()
+            return
+        self._vectors, self._assignments, self._keys = vectors, assignments, keys
+        self._grouped = len(self._keys)
+        self._loaded = True
+
+    def _assign(self, vectors: np.ndarray, chunk_size: int = 16384) -> np.ndarray:
+        assignments = np.zeros(len(vectors), dtype=np.int32)
+        if self.nlist > 1:
+            for start in range(0, len(vectors), chunk_size):
+                chunk = vectors[start:start + chunk_size]
+                assignments[start:start + len(chunk)] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignments
+
+    def _group(self):
+        """Reorders every row by cluster"""
+        order = np.argsort(np.asarray(self._assignments), kind="stable")
+        self._vectors = np.asarray(self._vectors)[order]
+        self._assignments = np.asarray(self._assignments)[order]
+        self._keys = [self._keys[i] for i in order]
+        self._grouped = len(self._keys)
+        self._lists = None
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Start offset of each cluster in the grouped rows, plus the rows added
+        since grouping ordered by cluster, with their own offsets.
+        """
+        if self._lists is None:
+            assignments = np.asarray(self._assignments)
+            offsets = _offsets(assignments[:self._grouped], self.nlist)
+            tail = assignments[self._grouped:]
+            tail_order = self._grouped + np.argsort(tail, kind="stable")
+            self._lists = offsets, tail_order, _offsets(tail, self.nlist)
+        return self._lists
+
+
+def _offsets(assignments: np.ndarray, nlist: int) -> np.ndarray:
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignments, minlength=nlist), out=offsets[1:])
+    return offsets
+
+
+def section_keys(sections: List[Dict], model_id: str) -> List[str]:
+    """Index keys of sections: their model, document, page and text"""
+    keys = []
+    for section in sections:
+        identity = f"{model_id}\0{section['document']}\0{section['page_number']}\0{section['text']}"
+        keys.append(hashlib.sha256(identity.encode("utf-8")).hexdigest()[:32])
+    return keys
+
+
+def rank_sections_ann(
+    index_dir: str,
+    task_embedding: np.ndarray,
+    section_embeddings: np.ndarray,
+    section_metadata: List[Dict],
+    keys: List[str],
+    top_n: int = 5,
+    nprobe: Optional[int] = None,
+    model_id: Optional[str] = None
+) -> List[Tuple[Dict, float]]:
+    """
+    rank_sections through the IVF index saved in index_dir. Sections missing
+    from the index are added (and the index saved) first; sections the index
+    holds that are not in section_metadata are skipped. An index built with
+    another model_id or embedding size is replaced by a new one.
+    """
+    dim = section_embeddings.shape[1]
+    index = IVFIndex.load(index_dir) if IVFIndex.exists(index_dir) else None
+    if index is not None and (index.dim != dim or index.model_id != model_id):
+        print(f"🗂️  Rebuilding the ANN index in {index_dir}: it holds {index.model_id or 'unknown'} "
+              f"embeddings ({index.dim}d), the loaded model is {model_id} ({dim}d)")
+        index = None
+    if index is None:
+        index = IVFIndex(dim, model_id=model_id)
+    new = index.missing(keys)
+    if new:
+        index.add(section_embeddings[new], [keys[i] for i in new])
+        index.save(index_dir)
+        print(f"🗂️  Added {len(new)} sections to the ANN index in {index_dir} ({len(index)} total)")
+
+    by_key = dict(zip(keys, section_metadata))
+    # Rows of edited documents stay in the index; they are filtered out of the probed lists
+    hits = index.search(task_embedding, k=top_n, nprobe=nprobe, keys=by_key.keys())[0]
+    return [(by_key[key], score) for key, score in hits]
+
+
+def _read_meta(directory: str) -> Dict:
+    with open(os.path.join(directory, META_NAME), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _remove_old_generations(directory: str, keep):
+    """Removes generation directories (and pre-generation files) not in keep"""
+    for entry in os.scandir(directory):
+        if entry.is_dir():
+            if entry.name in keep:
+                continue
+            if entry.name.endswith(TMP_SUFFIX) and time.time() - entry.stat().st_mtime < STALE_TMP_SECONDS:
+                continue  # another process may still be writing it
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.name in INDEX_FILES and "" not in keep:
+            os.remove(entry.path)
+
+
+def _write_json(path: str, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
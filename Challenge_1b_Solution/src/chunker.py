@@ -0,0 +1,108 @@
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Merged chunks still shorter than this are dropped (the token-level
+# counterpart of main.py's MIN_TEXT_LEN)
+DEFAULT_MIN_TOKENS = 24
+
+TokenOffsets = Callable[[Sequence[str]], List[List[Tuple[int, int]]]]
+
+
+def chunk_sections(
+    sections: List[Dict],
+    token_offsets: TokenOffsets,
+    max_tokens: int,
+    min_tokens: int = DEFAULT_MIN_TOKENS,
+    overlap: int = 0
+) -> List[Dict]:
+    """
+    Splits and merges page sections into windows of at most max_tokens
+    model tokens, so that nothing is lost to truncation at encoding time.
+
+    Pages longer than max_tokens are split into consecutive windows sharing
+    `overlap` tokens (the last window may overlap more, to stay full). Pages
+    shorter than min_tokens are merged with the neighbouring pages of the same
+    document while the total fits the budget; what is still too short after
+    merging is dropped.
+
+    Args:
+        sections: Page sections with document, page_number, section_title, text
+        token_offsets: Maps texts to the (start, end) character span of each of
+            their tokens, without special tokens (see embedder.token_offsets)
+        max_tokens: Token budget of a chunk (embedder.chunk_token_budget())
+        min_tokens: Smallest chunk kept
+        overlap: Tokens shared by consecutive windows of a split page
+
+    Returns:
+        Chunks with the section keys of their first page, plus "pages" (every
+        page they cover), "chunk_index" (window number within a split page)
+        and "token_count"
+    """
+    if not 0 <= overlap < max_tokens:
+        raise ValueError(f"overlap must be in [0, {max_tokens}), got {overlap}")
+
+    offsets = token_offsets([section["text"] for section in sections])
+    chunks = []
+    pending = []  # short pages of the current document waiting to be merged
+    pending_tokens = 0
+    document = None
+
+    def flush():
+        nonlocal pending, pending_tokens
+        if pending and pending_tokens >= min_tokens:
+            chunks.append(_merged_chunk(pending, pending_tokens))
+        elif pending and chunks and chunks[-1]["document"] == pending[0]["document"] \
+                and chunks[-1]["token_count"] + pending_tokens <= max_tokens:
+            # Too short on their own: appended to the previous chunk of the document
+            chunks[-1] = _merged_chunk([chunks[-1]] + pending, chunks[-1]["token_count"] + pending_tokens)
+        pending, pending_tokens = [], 0
+
+    for section, spans in zip(sections, offsets):
+        if section["document"] != document:
+            flush()
+            document = section["document"]
+        count = len(spans)
+
+        if count < min_tokens:
+            if pending_tokens + count > max_tokens:
+                flush()
+            pending.append(section)
+            pending_tokens += count
+            continue
+
+        if pending and pending_tokens + count <= max_tokens:
+            # Short pages before this one are merged into it
+            pending.append(section)
+            chunks.append(_merged_chunk(pending, pending_tokens + count))
+            pending, pending_tokens = [], 0
+            continue
+        flush()
+
+        starts = list(range(0, max(count - overlap, 1), max_tokens - overlap))
+        if len(starts) > 1 and count - starts[-1] < min_tokens:
+            # A too-short last window is extended back to a full one
+            starts[-1] = count - max_tokens
+        for index, start in enumerate(starts):
+            window = spans[start:start + max_tokens]
+            chunks.append({
+                **section,
+                "text": section["text"][window[0][0]:window[-1][1]],
+                "pages": [section["page_number"]],
+                "chunk_index": index,
+                "token_count": len(window),
+            })
+    flush()
+    return chunks
+
+
+def _merged_chunk(parts: List[Dict], token_count: int) -> Dict:
+    """One chunk from consecutive pages (or a chunk followed by pages)"""
+    pages = []
+    for part in parts:
+        pages.extend(part.get("pages", [part["page_number"]]))
+    return {
+        **parts[0],
+        "text": " ".join(part["text"] for part in parts if part["text"]),
+        "pages": pages,
+        "chunk_index": parts[0].get("chunk_index", 0),
+        "token_count": token_count,
+    }
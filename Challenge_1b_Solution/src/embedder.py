@@ -1,29 +1,231 @@
-from sentence_transformers import SentenceTransformer
+import atexit
 import numpy as np
-from typing import List
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from .embedding_cache import EmbeddingStore, DEFAULT_CAPACITY
+    from .onnx_backend import OnnxEmbedder, default_onnx_dir
+except ImportError:
+    from embedding_cache import EmbeddingStore, DEFAULT_CAPACITY
+    from onnx_backend import OnnxEmbedder, default_onnx_dir
+
+BACKENDS = ("torch", "onnx")
+
+# Padded tokens (batch size x longest input) encoded per model call; bounds
+# the activation memory of a batch whatever the corpus size
+DEFAULT_TOKEN_BUDGET = 4096
+MAX_BATCH_SIZE = 256
 
 model = None  
+model_name_loaded = None
+embedding_store = None
 
 
-def load_model(model_name: str = "all-MiniLM-L6-v2") -> SentenceTransformer:
+def load_model(
+    model_name: str = "all-MiniLM-L6-v2",
+    backend: str = "torch",
+    onnx_dir: Optional[str] = None,
+    threads: Optional[int] = None
+):
     """
     Loads a compact sentence embedding model for semantic similarity.
+
+    backend="onnx" runs the int8 ONNX export of the model from onnx_dir
+    (default: models/<model>-onnx, created by `python -m src.onnx_backend`).
+    threads bounds the intra-op threads used by either backend.
     """
-    global model
+    global model, model_name_loaded
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
     if model is None:
-        model = SentenceTransformer(model_name)
+        if backend == "onnx":
+            model = OnnxEmbedder(onnx_dir or default_onnx_dir(model_name), intra_op_threads=threads)
+            model_name_loaded = model.model_id
+        else:
+            # Imported here so the ONNX backend never loads PyTorch
+            from sentence_transformers import SentenceTransformer
+            if threads:
+                import torch
+                torch.set_num_threads(threads)
+            model = SentenceTransformer(model_name)
+            model_name_loaded = model_name
     return model
 
 
+def loaded_model_id() -> Optional[str]:
+    """
+    Name of the loaded model, tagged with its backend when not PyTorch.
+    """
+    return model_name_loaded
+
+
+def token_offsets(texts: Sequence[str]) -> List[List[Tuple[int, int]]]:
+    """
+    Character span of every model token of each text, without special
+    tokens and without truncation.
+    """
+    if model is None:
+        raise ValueError("Model not loaded. Call load_model() first.")
+    if hasattr(model, "token_offsets"):
+        return model.token_offsets(texts)
+    encoded = model.tokenizer(list(texts), add_special_tokens=False, return_offsets_mapping=True,
+                              truncation=False, verbose=False)
+    return [[tuple(span) for span in spans] for spans in encoded["offset_mapping"]]
+
+
+def chunk_token_budget() -> int:
+    """
+    Text tokens that fit in one model input (max_seq_length minus special tokens).
+    """
+    if model is None:
+        raise ValueError("Model not loaded. Call load_model() first.")
+    return model.max_seq_length - model.tokenizer.num_special_tokens_to_add(False)
+
+
+def enable_embedding_cache(directory: str, capacity: int = DEFAULT_CAPACITY) -> EmbeddingStore:
+    """
+    Caches embeddings on disk in `directory` (shared by runs and processes).
+    Up to `capacity` vectors are kept; least recently used ones are evicted.
+    Calling it again with the same directory returns the open cache.
+    The cache is closed when another one replaces it and at exit, which
+    saves the recency of the vectors it served.
+    """
+    global embedding_store
+    if model is None:
+        raise ValueError("Model not loaded. Call load_model() first.")
+    if embedding_store is not None and embedding_store.directory == directory:
+        return embedding_store
+    if embedding_store is not None:
+        embedding_store.close()
+        atexit.unregister(embedding_store.close)
+    embedding_store = EmbeddingStore(directory, model.get_sentence_embedding_dimension(), capacity)
+    atexit.register(embedding_store.close)
+    return embedding_store
+
+
+def token_lengths(texts: Sequence[str], chunk_size: int = 1024) -> np.ndarray:
+    """
+    Model input length of each text: special tokens included, capped at
+    max_seq_length. Texts are tokenized chunk by chunk to bound memory, and
+    only their first 8 characters per allowed token, since the rest would
+    be truncated anyway.
+    """
+    if model is None:
+        raise ValueError("Model not loaded. Call load_model() first.")
+    prefix = model.max_seq_length * 8
+    lengths = np.empty(len(texts), dtype=np.int64)
+    for start in range(0, len(texts), chunk_size):
+        chunk = [text[:prefix] for text in texts[start:start + chunk_size]]
+        lengths[start:start + len(chunk)] = [len(spans) for spans in token_offsets(chunk)]
+    lengths += model.tokenizer.num_special_tokens_to_add(False)
+    return np.minimum(lengths, model.max_seq_length)
+
+
+def plan_batches(
+    lengths: np.ndarray,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_batch_size: int = MAX_BATCH_SIZE
+) -> List[np.ndarray]:
+    """
+    Groups input positions into batches of similar length, longest first.
+    Each batch holds as many inputs as fit in token_budget once padded to
+    its longest input (at least one, at most max_batch_size).
+    """
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    batches = []
+    start = 0
+    while start < len(order):
+        longest = max(int(lengths[order[start]]), 1)
+        size = max(1, min(max_batch_size, token_budget // longest))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def iter_encode(
+    texts: Sequence[str],
+    normalize: bool = True,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_batch_size: int = MAX_BATCH_SIZE
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Encodes texts in length-bucketed batches, yielding (positions, embeddings)
+    per batch as it is done; positions index into `texts`.
+    """
+    if model is None:
+        raise ValueError("Model not loaded. Call load_model() first.")
+    for batch in plan_batches(token_lengths(texts), token_budget, max_batch_size):
+        embeddings = model.encode([texts[i] for i in batch], batch_size=len(batch), convert_to_numpy=True,
+                                  normalize_embeddings=normalize, show_progress_bar=False)
+        yield batch, embeddings
+
+
+def open_output(path: str, rows: int) -> np.ndarray:
+    """
+    Memory-mapped .npy file for encode_stream(out=...), sized for rows
+    embeddings of the loaded model.
+    """
+    if model is None:
+        raise ValueError("Model not loaded. Call load_model() first.")
+    return np.lib.format.open_memmap(path, mode="w+", dtype=np.float32,
+                                     shape=(rows, model.get_sentence_embedding_dimension()))
+
+
+def encode_stream(
+    texts: Sequence[str],
+    normalize: bool = True,
+    out: Optional[np.ndarray] = None,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_batch_size: int = MAX_BATCH_SIZE
+) -> np.ndarray:
+    """
+    Encodes texts batch by batch into `out` (default: a new array), which can
+    be preallocated or memory-mapped (open_output) to keep the embeddings of
+    a large corpus off the heap. Rows are in the order of `texts`.
+    """
+    if model is None:
+        raise ValueError("Model not loaded. Call load_model() first.")
+    if out is None:
+        out = np.empty((len(texts), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    for positions, embeddings in iter_encode(texts, normalize, token_budget, max_batch_size):
+        out[positions] = embeddings
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
+
+
 def encode_texts(texts: List[str], normalize: bool = True) -> np.ndarray:
     """
     Encodes a list of texts into dense vectors using the loaded model.
     Normalizes embeddings if required (for cosine similarity).
+
+    Texts are encoded in length-bucketed batches (see encode_stream). With
+    the embedding cache enabled, only texts missing from the cache are
+    encoded; the result is in the order of `texts` either way.
     """
     if model is None:
         raise ValueError("Model not loaded. Call load_model() first.")
 
-    embeddings = model.encode(texts, convert_to_numpy=True, normalize_embeddings=normalize)
+    if embedding_store is None:
+        return encode_stream(texts, normalize)
+
+    keys = [EmbeddingStore.key(model_name_loaded, normalize, text) for text in texts]
+    embeddings = np.empty((len(texts), embedding_store.dim), dtype=np.float32)
+    cached = embedding_store.get_many(keys)
+    for position, vector in cached.items():
+        embeddings[position] = vector
+
+    # Encode each missing text once, even if it repeats in `texts`
+    missing = {}
+    for position, key in enumerate(keys):
+        if position not in cached:
+            missing.setdefault(key, []).append(position)
+    if missing:
+        positions = list(missing.values())
+        encoded = encode_stream([texts[group[0]] for group in positions], normalize)
+        for group, vector in zip(positions, encoded):
+            embeddings[group] = vector
+        embedding_store.put_many(list(missing.keys()), encoded)
     return embeddings
 
 
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process locking
+    fcntl = None
+
+DEFAULT_CAPACITY = 200_000
+# Reads whose recency is kept in memory before it is written to index.log
+# (close() writes the rest)
+RECENCY_BATCH = 1024
+# index.log is folded into index.json once it holds more records than this
+# and than the index has entries
+COMPACT_MIN_RECORDS = 10_000
+
+
+class EmbeddingStore:
+    """
+    Persistent embedding cache shared between runs and processes.
+
+    Vectors live in a fixed-size memory-mapped float32 array (vectors.f32,
+    capacity x dim). index.json is a snapshot mapping each key to its row
+    and a logical last-used tick; index.log holds the changes made since,
+    one JSON record per line, and is folded into a new snapshot once it
+    outgrows the index. Reads take a shared lock and writes an exclusive
+    lock on a lock file; each process replays the records other processes
+    appended, and reloads the snapshot when it has been replaced. When the
+    store is full, the least recently used rows are reused.
+
+    Reads update recency in memory and write it every RECENCY_BATCH hits
+    (or with the next put_many); close() writes what is left, so a run that
+    only hits the cache still keeps its rows recent for the next one.
+    """
+
+    def __init__(self, directory: str, dim: int, capacity: int = DEFAULT_CAPACITY):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, 'index.json')
+        self.log_path = os.path.join(directory, 'index.log')
+        self.vectors_path = os.path.join(directory, 'vectors.f32')
+        self.lock_path = os.path.join(directory, '.lock')
+        self.hits = 0
+        self.misses = 0
+        self._index_stamp = None
+        self._touched = {}
+
+        with self._lock(exclusive=True):
+            if os.path.exists(self.index_path):
+                self._reload()
+                if self.index['dim'] != dim:
+                    raise ValueError(f"Embedding cache in {directory} has dim {self.index['dim']}, expected {dim}")
+            else:
+                self.index = {'dim': dim, 'capacity': capacity, 'clock': 0, 'entries': {}}
+                np.memmap(self.vectors_path, dtype=np.float32, mode='w+', shape=(capacity, dim)).flush()
+                self._compact()
+
+        self.dim = self.index['dim']
+        self.capacity = self.index['capacity']
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(self.capacity, self.dim))
+
+    @staticmethod
+    def key(model_name: str, normalize: bool, text: str) -> str:
+        digest = hashlib.sha256(f"{model_name}\0{int(normalize)}\0{text}".encode('utf-8'))
+        return digest.hexdigest()[:32]
+
+    def get_many(self, keys: Sequence[str]) -> Dict[int, np.ndarray]:
+        """Vectors for the keys that are cached, by position in keys"""
+        found = {}
+        with self._lock(exclusive=False):
+            self._reload_if_changed()
+            entries = self.index['entries']
+            for position, key in enumerate(keys):
+                entry = entries.get(key)
+                if entry is not None:
+                    found[position] = np.array(self.vectors[entry[0]])
+                    self._touched[key] = True
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        if len(self._touched) >= RECENCY_BATCH:
+            self._flush_recency()
+        return found
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray):
+        """Store vectors for keys, evicting least recently used rows when full"""
+        with self._lock(exclusive=True):
+            self._reload_if_changed()
+            entries = self.index['entries']
+
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in entries:
+                    new[key] = vector
+            # Recency alone is persisted in batches, not on every call
+            if not new and len(self._touched) < RECENCY_BATCH:
+                return
+
+            records = self._touch_records()
+            new_items = list(new.items())[-self.capacity:]
+            for (key, vector), row in zip(new_items, self._allocate_rows(len(new_items), records)):
+                self.vectors[row] = vector
+                self.index['clock'] += 1
+                records.append(self._apply([key, row, self.index['clock']]))
+            if new_items:
+                self.vectors.flush()
+            self._append_log(records)
+
+    def close(self):
+        """Writes the recency of rows read since the last write; the store stays usable"""
+        self._flush_recency()
+        self.vectors.flush()
+
+    def _flush_recency(self):
+        if not self._touched:
+            return
+        with self._lock(exclusive=True):
+            self._reload_if_changed()
+            self._append_log(self._touch_records())
+
+    def _touch_records(self) -> List[List]:
+        """Records moving the rows read since the last write to the recent end (lock held)"""
+        entries = self.index['entries']
+        records = []
+        for key in self._touched:
+            if key in entries:  # not evicted by another process meanwhile
+                self.index['clock'] += 1
+                records.append(self._apply([key, entries[key][0], self.index['clock']]))
+        self._touched = {}
+        return records
+
+    def _allocate_rows(self, count: int, records: List[List]) -> List[int]:
+        """Free rows, from the free list, then above the high-water mark, then by evicting"""
+        entries = self.index['entries']
+        rows = []
+        while len(rows) < count:
+            if self._free_rows:
+                rows.append(self._free_rows.pop())
+            elif self._high_water < self.capacity:
+                rows.append(self._high_water)
+                self._high_water += 1
+            else:
+                # Evict the least recently used entry (entries are kept in recency order)
+                records.append(self._apply([next(iter(entries))]))
+        return rows
+
+    def _apply(self, record: List) -> List:
+        """
+        Applies one index record: [key, row, tick] sets (or touches) an
+        entry, [key] evicts it. Returns the record.
+        """
+        entries = self.index['entries']
+        old = entries.pop(record[0], None)
+        if len(record) == 1:
+            if old is not None:
+                self._free_rows.add(old[0])
+            return record
+        key, row, tick = record
+        if old is not None and old[0] != row:
+            self._free_rows.add(old[0])
+        entries[key] = [row, tick]  # moves to the most recent end
+        self._free_rows.discard(row)
+        if row >= self._high_water:
+            self._free_rows.update(range(self._high_water, row))
+            self._high_water = row + 1
+        self.index['clock'] = max(self.index['clock'], tick)
+        return record
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _reload(self):
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+        self._index_stamp = self._stamp()
+        entries = self.index['entries']
+        self.index['entries'] = OrderedDict(sorted(entries.items(), key=lambda item: item[1][1]))
+        used = set(row for row, _ in entries.values())
+        self._high_water = max(used) + 1 if used else 0
+        self._free_rows = set(range(self._high_water)) - used
+        self._log_offset = 0
+        self._log_records = 0
+        self._replay_log()
+
+    def _reload_if_changed(self):
+        if self._stamp() != self._index_stamp:
+            self._reload()
+        else:
+            self._replay_log()
+
+    def _replay_log(self):
+        """Applies the complete records appended to index.log since the last replay"""
+        try:
+            with open(self.log_path, 'rb') as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        data = data[:data.rfind(b'\n') + 1]  # a torn last line is left for the writer to drop
+        self._log_offset += len(data)
+        for line in data.splitlines():
+            try:
+                self._apply(json.loads(line))
+            except ValueError:
+                continue
+            self._log_records += 1
+
+    def _append_log(self, records: List[List]):
+        if not records:
+            return
+        data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records).encode('utf-8')
+        with open(self.log_path, 'ab') as f:
+            if f.tell() > self._log_offset:
+                f.truncate(self._log_offset)  # torn line of an interrupted writer
+            f.write(data)
+        self._log_offset += len(data)
+        self._log_records += len(records)
+        if self._log_records > max(COMPACT_MIN_RECORDS, len(self.index['entries'])):
+            self._compact()
+
+    def _compact(self):
+        """Writes the index as a new snapshot and empties the log"""
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, separators=(',', ':'))
+        os.replace(tmp_path, self.index_path)
+        # A crash before the truncation only replays records the snapshot already holds
+        open(self.log_path, 'wb').close()
+        self._reload()
+
+    @contextmanager
+    def _lock(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self) -> Dict:
+        return {
+            'directory': self.directory,
+            'entries': len(self.index['entries']),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -2,11 +2,15 @@ import os
 import json
 import argparse
 
-from .parser import parse_documents
-from .embedder import load_model, encode_single, encode_texts
-from .ranker import rank_sections
+from .parser import parse_documents, IRCache
+from .embedder import (load_model, encode_single, encode_texts, enable_embedding_cache, loaded_model_id,
+                       token_offsets, chunk_token_budget)
+from .ranker import rank_queries
+from .ann_index import INDEX_DIR_NAME, rank_sections_ann, section_keys
+from .chunker import chunk_sections
+from .pipeline import start_parsing, rank_stream, shared_parse_pool
 from .output_generator import generate_output_json
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
 
 def load_input_json(input_path: str) -> Dict:
@@ -14,22 +18,23 @@ def load_input_json(input_path: str) -> Dict:
         return json.load(f)
 
 
-def main(input_dir: str):
-    # 1. Load input config
-    input_json_path = os.path.join(input_dir, "challenge1b_input.json")
-    input_data = load_input_json(input_json_path)
-
-    documents_info = input_data["documents"]
-    persona = input_data["persona"]["role"]
-    job = input_data["job_to_be_done"]["task"]
-
-    input_pdf_dir = os.path.join(input_dir, "PDFs")
-    document_filenames = [doc["filename"] for doc in documents_info]
-
-    print(f"🧾 Processing {len(document_filenames)} documents for '{persona}' task...")
-
-    # 2. Parse documents into page-level sections
-    parsed_docs = parse_documents(input_pdf_dir, document_filenames)
+def _rank_sequential(
+    input_dir: str,
+    input_pdf_dir: str,
+    document_filenames: List[str],
+    document_ir_cache,
+    task_query: str,
+    embedding_cache: Optional[str],
+    backend: str,
+    onnx_dir: Optional[str],
+    threads: Optional[int],
+    chunk: bool,
+    chunk_overlap: int,
+    ann: bool,
+    nprobe: Optional[int]
+) -> Tuple[List[Tuple[Dict, float]], Optional[List[Tuple[Dict, float]]]]:
+    """Parses everything, then encodes everything, then ranks"""
+    parsed_docs = parse_documents(input_pdf_dir, document_filenames, ir_cache=document_ir_cache)
     print(f"🔍 Parsed {sum(len(pages) for pages in parsed_docs.values())} total pages from {len(parsed_docs)} documents")
 
     section_chunks = []
@@ -42,38 +47,141 @@ def main(input_dir: str):
                 "text": page["text"]
             })
 
-    # Filter short/noisy text chunks
+    # Filter short/noisy text chunks (the chunker merges short pages instead)
     MIN_TEXT_LEN = 100
-    section_chunks = [s for s in section_chunks if len(s["text"]) >= MIN_TEXT_LEN]
-    print(f"🔎 Filtered to {len(section_chunks)} sections with text length >= {MIN_TEXT_LEN}")
+    if not chunk:
+        section_chunks = [s for s in section_chunks if len(s["text"]) >= MIN_TEXT_LEN]
+        print(f"🔎 Filtered to {len(section_chunks)} sections with text length >= {MIN_TEXT_LEN}")
 
-    # 3. Load model and encode everything
-    print("📦 Loading embedding model...")
-    model = load_model()
+    # Load model and encode everything
+    print(f"📦 Loading embedding model ({backend} backend)...")
+    model = load_model(backend=backend, onnx_dir=onnx_dir, threads=threads)
+
+    if chunk:
+        budget = chunk_token_budget()
+        section_chunks = chunk_sections(section_chunks, token_offsets, budget, overlap=chunk_overlap)
+        print(f"✂️  Chunked into {len(section_chunks)} windows of at most {budget} tokens "
+              f"({sum(c['token_count'] for c in section_chunks)} tokens total)")
+    store = enable_embedding_cache(embedding_cache) if embedding_cache else None
 
-    task_query = f"{persona.strip()}: {job.strip()}"
     task_embedding = encode_single(task_query)
 
     print(f"🔍 Encoding {len(section_chunks)} document sections...")
     section_texts = [section["text"] for section in section_chunks]
     section_embeddings = encode_texts(section_texts)
+    if store:
+        print(f"💾 Embedding cache: {store.hits} hits, {store.misses} misses")
 
-    # 4. Rank and extract top sections
+    # Rank and extract top sections
     print("📊 Ranking relevant sections...")
-    top_sections = rank_sections(task_embedding, section_embeddings, section_chunks, top_n=5)
+    if ann:
+        # Approximate search through the IVF index saved next to the collection
+        model_id = loaded_model_id()
+        keys = section_keys(section_chunks, model_id)
+        top_sections = rank_sections_ann(os.path.join(input_dir, INDEX_DIR_NAME), task_embedding,
+                                         section_embeddings, section_chunks, keys, top_n=5, nprobe=nprobe,
+                                         model_id=model_id)
+        bottom_sections = None
+    else:
+        ranking = rank_queries(task_embedding, section_embeddings, section_chunks, top_n=5, bottom_n=5)[0]
+        top_sections, bottom_sections = ranking["top"], ranking["bottom"]
+
+    return top_sections, bottom_sections
+
+
+def _rank_pipelined(
+    input_pdf_dir: str,
+    document_filenames: List[str],
+    document_ir_cache,
+    task_query: str,
+    embedding_cache: Optional[str],
+    backend: str,
+    onnx_dir: Optional[str],
+    threads: Optional[int],
+    chunk: bool,
+    chunk_overlap: int
+) -> Tuple[List[Tuple[Dict, float]], List[Tuple[Dict, float]]]:
+    """Parses in the background while the model loads and sections are encoded (see pipeline.py)"""
+    # The pool outlives this call, so later collections in the process reuse its workers
+    documents = start_parsing(input_pdf_dir, document_filenames, ir_cache=document_ir_cache,
+                              pool=shared_parse_pool())
+    try:
+        print(f"📦 Loading embedding model ({backend} backend) while parsing...")
+        load_model(backend=backend, onnx_dir=onnx_dir, threads=threads)
+        store = enable_embedding_cache(embedding_cache) if embedding_cache else None
+        task_embedding = encode_single(task_query)
+
+        print("🔍 Encoding and ranking sections as documents are parsed...")
+        result = rank_stream(documents, task_embedding, top_n=5, bottom_n=5, chunk=chunk,
+                             chunk_overlap=chunk_overlap)
+    finally:
+        documents.close()
+
+    timings = result["timings"]
+    print(f"🔍 Parsed {result['pages']} total pages, ranked {result['sections']} sections")
+    print(f"⏱️  Pipeline: parse {timings['parse']:.2f}s, encode {timings['encode']:.2f}s, "
+          f"encoder waited {timings['wait']:.2f}s, total {timings['total']:.2f}s")
+    if store:
+        print(f"💾 Embedding cache: {store.hits} hits, {store.misses} misses")
+    return result["top"], result["bottom"]
+
+
+def main(
+    input_dir: str,
+    embedding_cache: Optional[str] = None,
+    backend: str = "torch",
+    onnx_dir: Optional[str] = None,
+    threads: Optional[int] = None,
+    ann: bool = False,
+    nprobe: Optional[int] = None,
+    chunk: bool = False,
+    chunk_overlap: int = 0,
+    ir_cache: Optional[str] = None,
+    pipeline: bool = False
+):
+    # 1. Load input config
+    input_json_path = os.path.join(input_dir, "challenge1b_input.json")
+    input_data = load_input_json(input_json_path)
+
+    documents_info = input_data["documents"]
+    persona = input_data["persona"]["role"]
+    job = input_data["job_to_be_done"]["task"]
+
+    input_pdf_dir = os.path.join(input_dir, "PDFs")
+    document_filenames = [doc["filename"] for doc in documents_info]
+
+    print(f"🧾 Processing {len(document_filenames)} documents for '{persona}' task...")
+
+    if pipeline and ann:
+        raise ValueError("The pipelined mode ranks exactly; it cannot be combined with ann")
+
+    # 2-4. Parse documents into page-level sections, encode and rank them
+    document_ir_cache = None
+    if ir_cache:
+        if IRCache is None:
+            print("[WARNING] Challenge_1a_Solution is not importable; parsing without the IR cache")
+        else:
+            document_ir_cache = IRCache(ir_cache)
+    task_query = f"{persona.strip()}: {job.strip()}"
+    options = dict(embedding_cache=embedding_cache, backend=backend, onnx_dir=onnx_dir, threads=threads,
+                   chunk=chunk, chunk_overlap=chunk_overlap)
+    if pipeline:
+        top_sections, bottom_sections = _rank_pipelined(input_pdf_dir, document_filenames, document_ir_cache,
+                                                        task_query, **options)
+    else:
+        top_sections, bottom_sections = _rank_sequential(input_dir, input_pdf_dir, document_filenames,
+                                                         document_ir_cache, task_query, ann=ann,
+                                                         nprobe=nprobe, **options)
 
     print("\n🏆 Top 5 Sections:")
     for rank, (section, score) in enumerate(top_sections, start=1):
         print(f"Rank {rank}: {section['document']} → {section['section_title']} (score={score:.4f})")
 
     # Show bottom 5 sections for diagnostics
-    print("\n📉 Bottom 5 Sections (lowest scoring):")
-    all_with_scores = [
-        (meta, float(task_embedding @ emb.T)) for meta, emb in zip(section_chunks, section_embeddings)
-    ]
-    bottom_sections = sorted(all_with_scores, key=lambda x: x[1])[:5]
-    for section, score in bottom_sections:
-        print(f"↓ {section['document']} → {section['section_title']} (score={score:.4f})")
+    if bottom_sections is not None:
+        print("\n📉 Bottom 5 Sections (lowest scoring):")
+        for section, score in bottom_sections:
+            print(f"↓ {section['document']} → {section['section_title']} (score={score:.4f})")
 
     # 5. Generate output JSON
     print("\n📝 Generating final output...")
@@ -95,6 +203,27 @@ def main(input_dir: str):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run Persona-Driven PDF Analysis")
     parser.add_argument("--input_dir", type=str, required=True, help="Path to Collection folder")
+    parser.add_argument("--embedding_cache", type=str, default=os.environ.get("EMBEDDING_CACHE_DIR"),
+                        help="Directory for the persistent embedding cache (env EMBEDDING_CACHE_DIR)")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default=os.environ.get("EMBEDDING_BACKEND", "torch"),
+                        help="Embedding backend: PyTorch or int8 ONNX Runtime (env EMBEDDING_BACKEND)")
+    parser.add_argument("--onnx_model", type=str, default=os.environ.get("ONNX_MODEL_DIR"),
+                        help="Exported ONNX model directory (default: models/all-MiniLM-L6-v2-onnx)")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads for inference")
+    parser.add_argument("--chunk", action="store_true",
+                        help="Split long pages and merge short ones into windows of the model's max_seq_length")
+    parser.add_argument("--chunk_overlap", type=int, default=0, help="Tokens shared by windows of a split page")
+    parser.add_argument("--ann", action="store_true",
+                        help=f"Rank through an approximate (IVF) index kept in <input_dir>/{INDEX_DIR_NAME}")
+    parser.add_argument("--nprobe", type=int, default=None,
+                        help="Clusters searched per query with --ann (higher: better recall, slower)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap parsing (worker processes), model loading, encoding and ranking")
+    parser.add_argument("--ir_cache", type=str, default=os.environ.get("PDF_IR_CACHE_DIR"),
+                        help="Directory of decoded span IR files shared with Challenge 1A (env PDF_IR_CACHE_DIR)")
     args = parser.parse_args()
 
-    main(args.input_dir)
+    main(args.input_dir, embedding_cache=args.embedding_cache, backend=args.backend,
+         onnx_dir=args.onnx_model, threads=args.threads, ann=args.ann, nprobe=args.nprobe,
+         chunk=args.chunk, chunk_overlap=args.chunk_overlap, ir_cache=args.ir_cache,
+         pipeline=args.pipeline)
@@ -0,0 +1,199 @@
+"""
+ONNX Runtime backend for the sentence embedding model.
+
+Exports a SentenceTransformer (transformer + mean pooling) to an ONNX graph,
+quantizes its weights to int8 and runs it on CPU with ONNX Runtime:
+
+    python -m src.onnx_backend --model all-MiniLM-L6-v2 --output models/all-MiniLM-L6-v2-onnx
+
+OnnxEmbedder exposes the subset of the SentenceTransformer API used by
+embedder.py (encode, get_sentence_embedding_dimension), so it can be loaded
+in its place with load_model(backend="onnx").
+"""
+import argparse
+import inspect
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+CONFIG_NAME = "onnx_config.json"
+MODEL_FP32 = "model.onnx"
+MODEL_INT8 = "model_int8.onnx"
+
+
+def default_onnx_dir(model_name: str) -> str:
+    return os.path.join("models", os.path.basename(model_name.rstrip("/")) + "-onnx")
+
+
+class OnnxEmbedder:
+    """
+    Sentence encoder running an exported (optionally int8) ONNX graph on CPU.
+
+    intra_op_threads sets ONNX Runtime's thread pool for one inference
+    (default: ONNX Runtime picks the physical core count). Small batches keep
+    the session's activation arena (and so peak RSS) small at no cost in speed.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        intra_op_threads: Optional[int] = None,
+        quantized: bool = True,
+        batch_size: int = 8
+    ):
+        if ort is None:
+            raise ImportError("onnxruntime is required for the ONNX backend: pip install onnxruntime")
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, CONFIG_NAME), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        model_file = MODEL_INT8 if quantized and self.config.get("quantized") else MODEL_FP32
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        self.max_seq_length = self.config["max_seq_length"]
+        self.batch_size = batch_size
+        tokenizer_path = os.path.join(model_dir, "tokenizer.json")
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+        # Untruncated copy for counting tokens (chunking)
+        self._counting_tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.model_id = f"{self.config['model_name']}:onnx" + ("-int8" if model_file == MODEL_INT8 else "")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dimension"]
+
+    def token_offsets(self, texts: List[str]) -> List[List[Tuple[int, int]]]:
+        """Character span of every token of each text, without special tokens or truncation"""
+        return [encoding.offsets for encoding in
+                self._counting_tokenizer.encode_batch(list(texts), add_special_tokens=False)]
+
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        show_progress_bar: bool = False
+    ) -> np.ndarray:
+        """
+        Encodes texts in batches; matches SentenceTransformer.encode for the
+        exported pipeline (including its Normalize module, if it had one).
+        Like SentenceTransformer, batches are formed from texts sorted by
+        length to limit padding, and results come back in input order.
+        """
+        batch_size = batch_size or self.batch_size
+        embeddings = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in batch])
+            columns = {
+                "input_ids": [e.ids for e in encodings],
+                "attention_mask": [e.attention_mask for e in encodings],
+                "token_type_ids": [e.type_ids for e in encodings],
+            }
+            feed = {name: np.array(columns[name], dtype=np.int64) for name in self.input_names}
+            embeddings[batch] = self.session.run(None, feed)[0]
+
+        if normalize_embeddings or self.config.get("normalize"):
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.maximum(norms, 1e-12)
+        return embeddings
+
+
+def export_onnx(model_name: str, output_dir: str, quantize: bool = True, opset: int = 17) -> Dict:
+    """
+    Exports a SentenceTransformer with mean pooling to output_dir: the fp32
+    graph, its dynamically int8-quantized copy, the tokenizer and a config.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0]
+    pooling = next((module for module in st if isinstance(module, Pooling)), None)
+    pooling_config = pooling.get_config_dict() if pooling is not None else {}
+    pooling_mode = pooling_config.get("pooling_mode", "mean" if pooling_config.get("pooling_mode_mean_tokens") else None)
+    if pooling_mode != "mean":
+        raise ValueError(f"{model_name}: only mean-pooling models can be exported")
+
+    class MeanPooled(torch.nn.Module):
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+
+        def forward(self, input_ids, attention_mask, token_type_ids=None):
+            kwargs = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if token_type_ids is not None:
+                kwargs["token_type_ids"] = token_type_ids
+            hidden = self.encoder(**kwargs)[0]
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            return (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+
+    os.makedirs(output_dir, exist_ok=True)
+    sample = transformer.tokenizer(["an example sentence to export"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["sentence_embedding"] = {0: "batch"}
+
+    fp32_path = os.path.join(output_dir, MODEL_FP32)
+    # Newer torch defaults to the dynamo exporter; the TorchScript one handles these models
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            MeanPooled(transformer.auto_model).eval(),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["sentence_embedding"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            **legacy
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(output_dir, MODEL_INT8), weight_type=QuantType.QInt8)
+
+    transformer.tokenizer.save_pretrained(output_dir)
+    config = {
+        "model_name": model_name,
+        "dimension": st.get_sentence_embedding_dimension(),
+        "max_seq_length": st.max_seq_length,
+        "normalize": any(isinstance(module, Normalize) for module in st),
+        "quantized": quantize,
+        "pad_token": transformer.tokenizer.pad_token,
+        "pad_token_id": transformer.tokenizer.pad_token_id,
+    }
+    with open(os.path.join(output_dir, CONFIG_NAME), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a sentence embedding model to int8 ONNX")
+    parser.add_argument("--model", type=str, default="all-MiniLM-L6-v2", help="SentenceTransformer name or path")
+    parser.add_argument("--output", type=str, help="Output directory (default: models/<model>-onnx)")
+    parser.add_argument("--no_quantize", action="store_true", help="Only export the fp32 graph")
+    args = parser.parse_args()
+
+    output_dir = args.output or default_onnx_dir(args.model)
+    config = export_onnx(args.model, output_dir, quantize=not args.no_quantize)
+    print(f"✅ Exported {args.model} to {output_dir}: {config}")
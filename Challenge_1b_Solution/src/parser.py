@@ -1,64 +1,261 @@
 import fitz  # PyMuPDF
-from typing import List, Dict
+from typing import List, Dict, Optional, Iterator, Iterable, Tuple, Union, BinaryIO
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from collections import deque
 import os
 
+try:
+    # Span IR, and the page-range splitting and PDF sources shared with the
+    # Challenge 1A extractor (needs the repository root on sys.path)
+    from Challenge_1a_Solution.pdf_ir import (
+        IRCache, PARALLEL_PAGE_THRESHOLD, PAGE_RANGE_SIZE, PDFSource, page_ranges,
+        open_pdf as _open_pdf, read_source as _read_source
+    )
+except ImportError:  # standalone 1B image: pages are always parsed here, split the same way
+    IRCache = None
 
-def extract_pages(pdf_path: str) -> List[Dict]:
+    # Documents with at least this many pages are split into page ranges
+    # parsed in parallel worker processes
+    PARALLEL_PAGE_THRESHOLD = 200
+    PAGE_RANGE_SIZE = 50
+
+    # A PDF as the parser takes it: a path, its content, or a binary stream
+    PDFSource = Union[str, bytes, bytearray, BinaryIO]
+
+    def _read_source(source: PDFSource) -> Union[str, bytes, bytearray]:
+        """Paths and buffers unchanged; a stream is read into bytes, so it can be reopened"""
+        if hasattr(source, "read"):
+            return source.read()
+        return source
+
+    def _open_pdf(source: PDFSource):
+        if isinstance(source, (str, os.PathLike)):
+            return fitz.open(source)
+        return fitz.open(stream=_read_source(source), filetype="pdf")
+
+    def page_ranges(page_count: int, range_size: int = PAGE_RANGE_SIZE) -> List[Tuple[int, int]]:
+        return [(start, min(start + range_size, page_count)) for start in range(0, page_count, range_size)]
+
+
+def extract_pages(
+    pdf: PDFSource,
+    workers: Optional[int] = None,
+    parallel_threshold: int = PARALLEL_PAGE_THRESHOLD
+) -> List[Dict]:
     """
-    Extracts text from each page of the PDF.
+    Extracts text from each page of the PDF (a path, or its bytes or a
+    binary stream, opened in memory).
     Tries to identify potential section titles using font size.
     Returns a list of dicts with text and metadata.
+
+    Documents with at least parallel_threshold pages are split into page
+    ranges parsed by `workers` processes (default: CPU count, 1 disables);
+    the pages come back in document order, identical to a serial run.
     """
-    doc = fitz.open(pdf_path)
-    pages = []
+    pdf = _read_source(pdf)
+    doc = _open_pdf(pdf)
+    page_count = len(doc)
+    workers = workers or os.cpu_count() or 1
 
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        blocks = page.get_text("dict")["blocks"]
-        text = ""
-        potential_title = ""
+    if workers > 1 and page_count >= parallel_threshold:
+        doc.close()
+        ranges = page_ranges(page_count)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = pool.map(
+                _extract_page_range,
+                [pdf] * len(ranges),
+                [start for start, _ in ranges],
+                [stop for _, stop in ranges]
+            )
+            return [page for chunk in chunks for page in chunk]
 
-        max_font_size = 0
-        title_found = False
+    pages = [_extract_page(doc[page_num], page_num) for page_num in range(page_count)]
+    doc.close()
+    return pages
 
-        for block in blocks:
-            if "lines" not in block:
-                continue
-            for line in block["lines"]:
-                for span in line["spans"]:
-                    font_size = span["size"]
-                    span_text = span["text"].strip()
 
-                    # Heuristic: track largest-font span as possible title
-                    if font_size > max_font_size and len(span_text) > 3:
-                        max_font_size = font_size
-                        potential_title = span_text
+def _extract_page_range(pdf: PDFSource, start: int, stop: int) -> List[Dict]:
+    """
+    Parses pages [start, stop) with its own document handle (page-range worker).
+    """
+    doc = _open_pdf(pdf)
+    try:
+        return [_extract_page(doc[page_num], page_num) for page_num in range(start, stop)]
+    finally:
+        doc.close()
 
-                    text += span_text + " "
 
-        # Clean text
-        text = text.strip().replace('\n', ' ').replace('  ', ' ')
+def _extract_page(page, page_num: int) -> Dict:
+    """
+    Extracts the text and potential section title of a single page.
+    """
+    blocks = page.get_text("dict")["blocks"]
+    return _page_from_spans(
+        (
+            (span["text"].strip(), span["size"])
+            for block in blocks if "lines" in block
+            for line in block["lines"]
+            for span in line["spans"]
+        ),
+        page_num
+    )
 
-        # Add page to list
-        pages.append({
-            "page_number": page_num + 1,
-            "text": text,
-            "section_title": potential_title if potential_title else f"Page {page_num + 1}"
-        })
 
-    doc.close()
-    return pages
+def _pages_from_ir(ir) -> List[Dict]:
+    """
+    Page sections from a Challenge 1A DocumentIR, identical to _extract_page.
+    """
+    return [
+        _page_from_spans(
+            ((span.text, span.size) for line in ir.page_lines(page_num) for span in line),
+            page_num
+        )
+        for page_num in range(ir.page_count)
+    ]
 
 
-def parse_documents(input_folder: str, file_list: List[str]) -> Dict[str, List[Dict]]:
+def _parse_from_ir_cache(ir_cache, pdf: PDFSource, workers: int = 1) -> List[Dict]:
+    """
+    Page sections of a PDF through a Challenge 1A IRCache (decoded on a miss).
+    """
+    return _pages_from_ir(ir_cache.load_or_extract(pdf, workers, PARALLEL_PAGE_THRESHOLD))
+
+
+def _page_from_spans(spans: Iterable[Tuple[str, float]], page_num: int) -> Dict:
+    """
+    Page text and potential section title from its (stripped text, font size) spans.
+    """
+    span_texts = []
+    potential_title = ""
+
+    max_font_size = 0
+
+    for span_text, font_size in spans:
+        # Heuristic: track largest-font span as possible title
+        if font_size > max_font_size and len(span_text) > 3:
+            max_font_size = font_size
+            potential_title = span_text
+
+        span_texts.append(span_text)
+
+    # Clean text (joined once: linear in the page's text size)
+    text = " ".join(span_texts).strip().replace('\n', ' ').replace('  ', ' ')
+
+    return {
+        "page_number": page_num + 1,
+        "text": text,
+        "section_title": potential_title if potential_title else f"Page {page_num + 1}"
+    }
+
+
+def parse_documents(
+    input_folder: Optional[str],
+    file_list: List[Union[str, Tuple[str, PDFSource]]],
+    workers: Optional[int] = None,
+    as_generator: bool = False,
+    ir_cache=None
+) -> Union[Dict[str, List[Dict]], Iterator[Tuple[str, List[Dict]]]]:
     """
     Parses multiple PDFs and returns a dictionary of document -> list of page data.
+
+    file_list holds filenames in input_folder, or (document, source) pairs
+    for PDFs given by path or held in memory (bytes or a binary stream),
+    which are parsed without touching the disk.
+
+    Files are parsed concurrently by `workers` processes (default: CPU count,
+    1 parses them one after another). With as_generator=True, returns an
+    iterator of (document, pages) pairs instead, in file_list order, each
+    yielded as soon as that file is parsed.
+
+    ir_cache (a Challenge 1A IRCache) reuses the span IR of PDFs the outline
+    extractor, or an earlier parse, already decoded, and stores the others.
+    """
+    documents = iter_documents(input_folder, file_list, workers, ir_cache)
+    if as_generator:
+        return documents
+    return dict(documents)
+
+
+def iter_documents(
+    input_folder: Optional[str],
+    file_list: List[Union[str, Tuple[str, PDFSource]]],
+    workers: Optional[int] = None,
+    ir_cache=None,
+    pool: Optional[Executor] = None,
+    max_pending: Optional[int] = None
+) -> Iterator[Tuple[str, List[Dict]]]:
+    """
+    Yields (document, pages) for each existing file of file_list (filenames
+    or (document, source) pairs, see parse_documents), in order.
+
+    All files share one process pool; files with at least
+    PARALLEL_PAGE_THRESHOLD pages are further split into page ranges
+    (except through ir_cache, where a file is one job).
+
+    pool: an executor owned by the caller, used even for a single file
+    max_pending: most documents submitted but not yet yielded (default: all),
+        so a slow consumer holds back parsing instead of buffering every file
     """
-    parsed = {}
-    for filename in file_list:
-        pdf_path = os.path.join(input_folder, filename)
+    workers = workers or os.cpu_count() or 1
+    found = []
+    for entry in file_list:
+        if isinstance(entry, tuple):
+            # Streams are read here: the pooled path pickles the source to a worker
+            found.append((entry[0], _read_source(entry[1])))
+            continue
+        pdf_path = os.path.join(input_folder, entry)
         if os.path.exists(pdf_path):
-            parsed[filename] = extract_pages(pdf_path)
+            found.append((entry, pdf_path))
         else:
             print(f"[WARNING] File not found: {pdf_path}")
-    return parsed
+
+    if pool is None and (workers == 1 or len(found) < 2):
+        for filename, pdf in found:
+            if ir_cache is not None:
+                yield filename, _parse_from_ir_cache(ir_cache, pdf, workers)
+            else:
+                yield filename, extract_pages(pdf, workers=workers)
+        return
+
+    if pool is None:
+        with ProcessPoolExecutor(max_workers=workers) as own_pool:
+            yield from _iter_documents_pooled(own_pool, found, ir_cache, max_pending)
+    else:
+        yield from _iter_documents_pooled(pool, found, ir_cache, max_pending)
+
+
+def _iter_documents_pooled(
+    pool: Executor,
+    found: List[Tuple[str, PDFSource]],
+    ir_cache,
+    max_pending: Optional[int]
+) -> Iterator[Tuple[str, List[Dict]]]:
+    def submit(pdf: PDFSource) -> List[Future]:
+        if ir_cache is not None:
+            return [pool.submit(_parse_from_ir_cache, ir_cache, pdf)]
+        doc = _open_pdf(pdf)
+        page_count = len(doc)
+        doc.close()
+        ranges = page_ranges(page_count) if page_count >= PARALLEL_PAGE_THRESHOLD else [(0, page_count)]
+        return [pool.submit(_extract_page_range, pdf, start, stop) for start, stop in ranges]
+
+    files = iter(found)
+    pending = deque()
+    for filename, pdf in files:
+        pending.append((filename, submit(pdf)))
+        if max_pending and len(pending) >= max_pending:
+            break
+
+    try:
+        while pending:
+            filename, futures = pending.popleft()
+            pages = [page for future in futures for page in future.result()]
+            next_file = next(files, None)
+            if next_file is not None:
+                pending.append((next_file[0], submit(next_file[1])))
+            yield filename, pages
+    finally:
+        # Stopped early: do not leave this iteration's files queued on a shared pool
+        for _, futures in pending:
+            for future in futures:
+                future.cancel()
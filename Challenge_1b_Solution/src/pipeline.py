@@ -0,0 +1,247 @@
+"""
+Pipelined analysis: parsing, encoding and ranking overlap instead of
+running one after another.
+
+start_parsing() parses the PDFs in worker processes, fed by a producer
+thread, and hands finished documents over through a bounded queue.
+Meanwhile the caller loads the model. rank_stream() then turns each
+document into sections as it arrives, encodes them in batches and keeps
+a running top-k (RunningTopK), so no stage waits for the whole corpus.
+End-to-end time approaches max(parse, encode) rather than their sum.
+
+Memory is bounded too: at most max_pending documents are being parsed and
+queue_size parsed documents wait for the encoder; a slow encoder holds
+back the parser.
+
+Worker processes are spawned, which costs an interpreter start and the
+PyMuPDF/NumPy imports each. Long-running callers pass shared_parse_pool()
+so that cost is paid once per process rather than once per stream.
+"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .parser import iter_documents
+from .embedder import encode_texts, token_offsets, chunk_token_budget
+from .ranker import RunningTopK, score_matrix
+from .chunker import chunk_sections
+
+# Same filter as main.py
+MIN_TEXT_LEN = 100
+# Parsed documents waiting for the encoder
+DEFAULT_QUEUE_SIZE = 4
+# Sections per encode_texts call
+DEFAULT_ENCODE_BATCH = 64
+
+_DONE = object()
+
+_shared_pool = None
+_shared_pool_pid = None
+_shared_pool_lock = threading.Lock()
+
+
+def parse_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """A new process pool for parsing; the caller shuts it down"""
+    # Spawned workers: the parent may be loading a model in other threads meanwhile
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+def shared_parse_pool() -> ProcessPoolExecutor:
+    """
+    The parse pool of this process, created on first use (and again in a
+    forked child, which does not inherit the pool's threads)
+    """
+    global _shared_pool, _shared_pool_pid
+    with _shared_pool_lock:
+        if _shared_pool is None or _shared_pool_pid != os.getpid():
+            _shared_pool = parse_pool()
+            _shared_pool_pid = os.getpid()
+        return _shared_pool
+
+
+class DocumentStream:
+    """
+    Parsed (document, pages) pairs in file_list order, produced in the
+    background. Iterate it once; close() stops the producer early.
+
+    pool: a parse pool owned by the caller (e.g. shared_parse_pool()); by
+        default the stream starts its own and shuts it down on close()
+    """
+
+    def __init__(
+        self,
+        input_folder: str,
+        file_list: List[str],
+        workers: Optional[int] = None,
+        ir_cache=None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        max_pending: Optional[int] = None,
+        pool: Optional[ProcessPoolExecutor] = None
+    ):
+        workers = workers or os.cpu_count() or 1
+        # Files that exist now: missing ones are skipped by iter_documents and never arrive
+        self.total = sum(1 for entry in file_list
+                         if isinstance(entry, tuple) or os.path.exists(os.path.join(input_folder, entry)))
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+        self.owns_pool = pool is None
+        self.pool = pool or parse_pool(workers)
+        self.parse_seconds = None
+        self.wait_seconds = 0.0
+        self.started_at = time.perf_counter()
+        self.thread = threading.Thread(
+            target=self._produce,
+            args=(input_folder, file_list, workers, ir_cache, max_pending or 2 * workers),
+            daemon=True
+        )
+        self.thread.start()
+
+    def _produce(self, input_folder, file_list, workers, ir_cache, max_pending):
+        try:
+            documents = iter_documents(input_folder, file_list, workers, ir_cache,
+                                       pool=self.pool, max_pending=max_pending)
+            try:
+                for document in documents:
+                    if not self._put(document):
+                        return
+            finally:
+                documents.close()  # cancels the files still queued on the pool
+            self.parse_seconds = time.perf_counter() - self.started_at
+            self._put(_DONE)
+        except BaseException as e:  # re-raised in the consumer
+            self._put(e)
+
+    def _put(self, item) -> bool:
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self) -> Iterator[Tuple[str, List[Dict]]]:
+        while True:
+            start = time.perf_counter()
+            item = self.queue.get()
+            self.wait_seconds += time.perf_counter() - start
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        if self.owns_pool:
+            self.pool.shutdown(cancel_futures=True)
+
+
+def start_parsing(
+    input_folder: str,
+    file_list: List[str],
+    workers: Optional[int] = None,
+    ir_cache=None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    pool: Optional[ProcessPoolExecutor] = None
+) -> DocumentStream:
+    """Starts parsing file_list in the background; see DocumentStream"""
+    return DocumentStream(input_folder, file_list, workers, ir_cache, queue_size, pool=pool)
+
+
+def document_sections(document: str, pages: List[Dict]) -> List[Dict]:
+    """Page-level sections of one parsed document"""
+    return [
+        {
+            "document": document,
+            "page_number": page["page_number"],
+            "section_title": page.get("section_title", f"Page {page['page_number']}"),
+            "text": page["text"]
+        }
+        for page in pages
+    ]
+
+
+def rank_stream(
+    documents: DocumentStream,
+    task_embedding: np.ndarray,
+    top_n: int = 5,
+    bottom_n: int = 0,
+    chunk: bool = False,
+    chunk_overlap: int = 0,
+    encode_batch: int = DEFAULT_ENCODE_BATCH,
+    on_progress: Optional[Callable[[str, int, int], None]] = None
+) -> Dict:
+    """
+    Consumes a DocumentStream with the model loaded: sections are filtered
+    (or chunked, per document), encoded encode_batch at a time and scored
+    against task_embedding as they arrive.
+
+    on_progress(stage, done, total) is called after each document with
+    ("parsed", documents, documents.total) and after each encoder call with
+    ("encoded", sections, sections known so far).
+
+    Returns:
+        "top" and "bottom" (section, score) lists as in rank_queries, plus the
+        "pages" and "sections" counts and "timings" in seconds: "parse" (until
+        the last document was parsed), "encode", "wait" (encoder idle,
+        waiting for documents) and "total" (since parsing started)
+    """
+    top = RunningTopK(top_n)
+    bottom = RunningTopK(bottom_n, largest=False)
+    budget = chunk_token_budget() if chunk else None
+    buffer = []
+    pages = sections = encoded = parsed = 0
+    encode_seconds = 0.0
+
+    def flush():
+        nonlocal encode_seconds, encoded
+        encode_start = time.perf_counter()
+        embeddings = encode_texts([section["text"] for section in buffer])
+        scores = score_matrix(task_embedding, embeddings)[0]
+        encode_seconds += time.perf_counter() - encode_start
+        top.push(scores, buffer)
+        bottom.push(scores, buffer)
+        encoded += len(buffer)
+        buffer.clear()
+        if on_progress:
+            on_progress("encoded", encoded, sections)
+
+    for document, document_pages in documents:
+        parsed += 1
+        if on_progress:
+            on_progress("parsed", parsed, documents.total)
+        pages += len(document_pages)
+        new_sections = document_sections(document, document_pages)
+        if chunk:
+            new_sections = chunk_sections(new_sections, token_offsets, budget, overlap=chunk_overlap)
+        else:
+            new_sections = [s for s in new_sections if len(s["text"]) >= MIN_TEXT_LEN]
+        sections += len(new_sections)
+        for section in new_sections:
+            buffer.append(section)
+            if len(buffer) >= encode_batch:
+                flush()
+    if buffer:
+        flush()
+
+    return {
+        "top": top.result(),
+        "bottom": bottom.result(),
+        "pages": pages,
+        "sections": sections,
+        "timings": {
+            "parse": documents.parse_seconds,
+            "encode": encode_seconds,
+            "wait": documents.wait_seconds,
+            "total": time.perf_counter() - documents.started_at,
+        },
+    }
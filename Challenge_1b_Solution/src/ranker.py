@@ -1,8 +1,131 @@
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from typing import List, Dict, Tuple
 
 
+def score_matrix(
+    query_embeddings: np.ndarray,
+    section_embeddings: np.ndarray,
+    normalized: bool = True
+) -> np.ndarray:
+    """
+    Cosine similarity of every query against every section, as one
+    (queries x sections) matrix product.
+
+    Embeddings from encode_texts are already L2-normalized, so the product
+    is the cosine similarity; pass normalized=False for raw embeddings.
+    """
+    queries = np.atleast_2d(np.asarray(query_embeddings))
+    sections = np.asarray(section_embeddings)
+    if not normalized:
+        queries = _l2_normalize(queries)
+        sections = _l2_normalize(sections)
+    return queries @ sections.T
+
+
+def _l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def select_top_k(scores: np.ndarray, k: int, largest: bool = True) -> List[np.ndarray]:
+    """
+    Indices of the k highest (or lowest) scores of each row, best first.
+
+    argpartition finds the k-th score in linear time and only the candidates
+    up to it are sorted; equal scores keep section order, as a stable sort
+    of all sections would.
+    """
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    selected = []
+    for row in scores:
+        if k <= 0:
+            selected.append(np.empty(0, dtype=np.intp))
+            continue
+        keyed = -row if largest else row
+        kth = keyed[np.argpartition(keyed, k - 1)[k - 1]]
+        candidates = np.flatnonzero(keyed <= kth)
+        order = np.lexsort((candidates, keyed[candidates]))
+        selected.append(candidates[order[:k]])
+    return selected
+
+
+class RunningTopK:
+    """
+    The k highest (or lowest) scored items of a stream of batches.
+
+    Only the current k survivors are kept between pushes. Items are numbered
+    in arrival order and equal scores keep that order, so the result is the
+    one select_top_k would give over the whole stream at once.
+    """
+
+    def __init__(self, k: int, largest: bool = True):
+        self.k = k
+        self.largest = largest
+        self.scores = np.empty(0, dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.items = {}
+        self.count = 0
+
+    def push(self, scores: np.ndarray, items: List[Dict]):
+        """Adds a batch of scores and the items they belong to"""
+        scores = np.asarray(scores).ravel()
+        ids = np.arange(self.count, self.count + len(scores))
+        self.count += len(scores)
+        if self.k <= 0 or not len(scores):
+            return
+        # Only a batch's own top k can make it into the overall top k
+        candidates = select_top_k(scores, self.k, largest=self.largest)[0]
+        all_scores = np.concatenate([self.scores, scores[candidates]])
+        all_ids = np.concatenate([self.ids, ids[candidates]])
+        keyed = -all_scores if self.largest else all_scores
+        keep = np.lexsort((all_ids, keyed))[:self.k]
+        self.scores, self.ids = all_scores[keep], all_ids[keep]
+
+        self.items.update((int(ids[i]), items[i]) for i in candidates)
+        self.items = {i: self.items[i] for i in self.ids.tolist()}
+
+    def result(self) -> List[Tuple[Dict, float]]:
+        """(item, score) tuples, best first"""
+        return [(self.items[int(i)], float(score)) for i, score in zip(self.ids, self.scores)]
+
+
+def rank_queries(
+    query_embeddings: np.ndarray,
+    section_embeddings: np.ndarray,
+    section_metadata: List[Dict],
+    top_n: int = 5,
+    bottom_n: int = 0,
+    normalized: bool = True
+) -> List[Dict[str, List[Tuple[Dict, float]]]]:
+    """
+    Ranks one corpus of sections against many queries in a single call.
+
+    Args:
+        query_embeddings: Query vectors, one per row (or a single 1D vector)
+        section_embeddings: Array of section vectors (2D)
+        section_metadata: List of metadata for each section (doc name, page, title)
+        top_n: Number of most relevant sections to return per query
+        bottom_n: Number of least relevant sections to return per query (diagnostics)
+        normalized: Whether the embeddings are already L2-normalized
+
+    Returns:
+        One dict per query: "top" holds (section_metadata, score) tuples from the
+        most relevant down, "bottom" from the least relevant up
+    """
+    scores = score_matrix(query_embeddings, section_embeddings, normalized=normalized)
+    top = select_top_k(scores, top_n)
+    bottom = select_top_k(scores, bottom_n, largest=False)
+
+    return [
+        {
+            "top": [(section_metadata[i], float(row[i])) for i in top_indices],
+            "bottom": [(section_metadata[i], float(row[i])) for i in bottom_indices],
+        }
+        for row, top_indices, bottom_indices in zip(scores, top, bottom)
+    ]
+
+
 def rank_sections(
     task_embedding: np.ndarray,
     section_embeddings: np.ndarray,
@@ -21,14 +144,4 @@ def rank_sections(
     Returns:
         List of tuples: (section_metadata, similarity_score), sorted by relevance
     """
-    # Ensure the shape
-    if task_embedding.ndim == 1:
-        task_embedding = task_embedding.reshape(1, -1)
-
-    similarities = cosine_similarity(task_embedding, section_embeddings)[0]
-    ranked = sorted(
-        zip(section_metadata, similarities),
-        key=lambda x: x[1],
-        reverse=True
-    )
-    return ranked[:top_n]
+    return rank_queries(task_embedding, section_embeddings, section_metadata, top_n=top_n)[0]["top"]
@@ -0,0 +1,208 @@
+"""
+Admission control for the heavy endpoints.
+
+Each endpoint has an AdmissionController with `slots` units of capacity.
+A request asks for as many units as its estimated cost (estimate_cost():
+pages and bytes of its uploads, at least 1 and at most `slots`), so a large
+upload holds more of the endpoint than a small one. Requests that do not
+fit wait in a FIFO queue holding at most `max_queued` units; beyond that
+admit() raises AdmissionRejected at once, with a Retry-After estimated
+from how long admitted requests have held their slots.
+
+check() rejects a request while the queue is already full, before its
+body is read, so a burst of uploads is turned away without parsing them.
+"""
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Iterable, Optional
+
+DEFAULT_PAGES_PER_SLOT = 100
+DEFAULT_BYTES_PER_SLOT = 20 * 1024 * 1024
+# Retry-After (seconds) until a request has been timed, and its bounds
+DEFAULT_RETRY_AFTER = 10
+MAX_RETRY_AFTER = 300
+# Weight of the latest request in the moving average of seconds per slot
+EWMA_WEIGHT = 0.2
+
+
+class AdmissionRejected(Exception):
+    """Raised when an endpoint's wait queue is full (or a wait timed out)"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_cost(pages: Optional[int], nbytes: int, pages_per_slot: int = DEFAULT_PAGES_PER_SLOT,
+                  bytes_per_slot: int = DEFAULT_BYTES_PER_SLOT) -> int:
+    """Slots for a request of `pages` pages (None: unknown) and `nbytes` bytes"""
+    units = nbytes / bytes_per_slot
+    if pages is not None:
+        units = max(units, pages / pages_per_slot)
+    return max(1, math.ceil(units))
+
+
+class Ticket:
+    """One admitted (or waiting) request; release() it when the work is done"""
+
+    def __init__(self, controller: 'AdmissionController', cost: int):
+        self.controller = controller
+        self.cost = cost
+        self.granted = False
+        self.released = False
+        self.queued_at = time.monotonic()
+        self.granted_at = None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Waits until the slots are granted; False (and out of the queue) after timeout"""
+        return self.controller._wait(self, timeout)
+
+    def release(self):
+        """Returns the slots (or leaves the queue); safe to call more than once"""
+        self.controller._release(self)
+
+    def release_when_done(self, futures: Iterable[Future]):
+        """
+        Releases the ticket once every future is done (at once if there are
+        none), so slots stay taken while the work runs on even after the
+        request that submitted it went away
+        """
+        futures = list(futures)
+        remaining = len(futures)
+        lock = threading.Lock()
+
+        def done(_):
+            nonlocal remaining
+            with lock:
+                remaining -= 1
+                last = remaining == 0
+            if last:
+                self.release()
+
+        if not futures:
+            self.release()
+        for future in futures:
+            future.add_done_callback(done)
+
+
+class AdmissionController:
+    """Weighted concurrency limit with a bounded FIFO wait queue; thread-safe"""
+
+    def __init__(self, name: str, slots: int, max_queued: int):
+        self.name = name
+        self.slots = max(1, slots)
+        self.max_queued = max_queued  # in slots, 0: no waiting
+        self._in_use = 0
+        self._running = 0
+        self._waiting = deque()
+        self._queued_cost = 0
+        self._condition = threading.Condition()
+        self._seconds_per_slot = None
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+
+    def check(self):
+        """Raises AdmissionRejected if no request could queue right now"""
+        with self._condition:
+            busy = self._waiting or self._in_use >= self.slots
+            if busy and self._queued_cost + 1 > self.max_queued:
+                self.rejected += 1
+                raise AdmissionRejected(f"{self.name}: {len(self._waiting)} requests waiting",
+                                        self._retry_after())
+
+    def admit(self, cost: int) -> Ticket:
+        """
+        A ticket for `cost` slots (clamped to 1..slots): granted at once if
+        they are free and nobody is waiting, queued otherwise. Raises
+        AdmissionRejected when the queue has no room for it.
+        """
+        ticket = Ticket(self, min(max(1, cost), self.slots))
+        with self._condition:
+            if not self._waiting and self._in_use + ticket.cost <= self.slots:
+                self._grant(ticket)
+            elif self._queued_cost + ticket.cost <= self.max_queued:
+                self._waiting.append(ticket)
+                self._queued_cost += ticket.cost
+            else:
+                self.rejected += 1
+                raise AdmissionRejected(
+                    f"{self.name}: {self._in_use}/{self.slots} slots in use, "
+                    f"{self._queued_cost}/{self.max_queued} queued", self._retry_after())
+        return ticket
+
+    def _grant(self, ticket: Ticket):
+        ticket.granted = True
+        ticket.granted_at = time.monotonic()
+        self._in_use += ticket.cost
+        self._running += 1
+        self.admitted += 1
+        self.total_wait += ticket.granted_at - ticket.queued_at
+
+    def _grant_waiting(self):
+        # Strictly in arrival order, so a large request is not starved by small ones
+        while self._waiting and self._in_use + self._waiting[0].cost <= self.slots:
+            ticket = self._waiting.popleft()
+            self._queued_cost -= ticket.cost
+            self._grant(ticket)
+        self._condition.notify_all()
+
+    def _wait(self, ticket: Ticket, timeout: Optional[float]) -> bool:
+        with self._condition:
+            if self._condition.wait_for(lambda: ticket.granted or ticket.released, timeout):
+                return ticket.granted
+            self._waiting.remove(ticket)
+            self._queued_cost -= ticket.cost
+            ticket.released = True
+            self.timed_out += 1
+            self._grant_waiting()
+            return False
+
+    def _release(self, ticket: Ticket):
+        with self._condition:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.granted:
+                self._in_use -= ticket.cost
+                self._running -= 1
+                held = (time.monotonic() - ticket.granted_at) / ticket.cost
+                if self._seconds_per_slot is None:
+                    self._seconds_per_slot = held
+                else:
+                    self._seconds_per_slot += EWMA_WEIGHT * (held - self._seconds_per_slot)
+            else:
+                self._waiting.remove(ticket)
+                self._queued_cost -= ticket.cost
+            self._grant_waiting()
+
+    def _retry_after(self) -> int:
+        """Seconds until the work now admitted and queued should have drained"""
+        if self._seconds_per_slot is None:
+            return DEFAULT_RETRY_AFTER
+        backlog = (self._in_use + self._queued_cost) / self.slots
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(backlog * self._seconds_per_slot)))
+
+    def retry_after(self) -> int:
+        with self._condition:
+            return self._retry_after()
+
+    def stats(self) -> Dict:
+        with self._condition:
+            return {
+                'slots': self.slots,
+                'in_use': self._in_use,
+                'running': self._running,
+                'queued': len(self._waiting),
+                'queued_slots': self._queued_cost,
+                'max_queued_slots': self.max_queued,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'avg_wait_seconds': round(self.total_wait / self.admitted, 3) if self.admitted else 0.0,
+                'retry_after': self._retry_after(),
+            }
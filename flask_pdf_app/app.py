@@ -1,13 +1,23 @@
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for
+from flask import Flask, Request, Response, render_template, request, jsonify, flash, redirect, url_for, stream_with_context
+import io
 import os
 import json
 import tempfile
+import threading
 import shutil
 from werkzeug.utils import secure_filename
 
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from .admission import AdmissionController, AdmissionRejected, estimate_cost
+    from .jobs import JobManager, JobQueueFull, sse_events
+except ImportError:
+    from admission import AdmissionController, AdmissionRejected, estimate_cost
+    from jobs import JobManager, JobQueueFull, sse_events
+
 # -------- App setup --------
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this'
@@ -19,11 +29,37 @@ ALLOWED_EXTENSIONS = {'pdf'}
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Uploads up to UPLOAD_SPOOL_MB are parsed straight from memory; larger ones
+# are spooled to a temporary file in UPLOAD_FOLDER
+UPLOAD_SPOOL_BYTES = int(os.environ.get('UPLOAD_SPOOL_MB', '16')) * 1024 * 1024
+
+
+class SpooledUploadRequest(Request):
+    """
+    Keeps the uploaded files of requests up to UPLOAD_SPOOL_BYTES in memory
+    and spools larger (or unsized) ones to named temporary files, which the
+    parsers open by path. The files are removed when the request ends.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= UPLOAD_SPOOL_BYTES:
+            return io.BytesIO()
+        return tempfile.NamedTemporaryFile('wb+', suffix='.pdf', dir=UPLOAD_FOLDER)
+
+
+app.request_class = SpooledUploadRequest
+
 
 # -------- Optional imports (Challenge modules) --------
 try:
     # Challenge 1A lives in: Challenge_1a_Solution/process_pdfs.py
     from Challenge_1a_Solution.process_pdfs import PDFOutlineExtractor
+    from Challenge_1a_Solution.outline_cache import OutlineCache
+    from Challenge_1a_Solution.pdf_ir import IRCache
+    try:
+        from .outline_pool import OutlinePool
+    except ImportError:
+        from outline_pool import OutlinePool
     CHALLENGE_1A_AVAILABLE = True
 except ImportError:
     print("Warning: Challenge 1A not available")
@@ -33,9 +69,10 @@ try:
     # Challenge 1B lives in: Challenge_1b_Solution/src/*.py
     from Challenge_1b_Solution.src.main import main as challenge1b_main
     from Challenge_1b_Solution.src.parser import parse_documents
-    from Challenge_1b_Solution.src.embedder import load_model, encode_single, encode_texts
+    from Challenge_1b_Solution.src.embedder import load_model, encode_single, encode_texts, enable_embedding_cache
     from Challenge_1b_Solution.src.ranker import rank_sections
     from Challenge_1b_Solution.src.output_generator import generate_output_json
+    from Challenge_1b_Solution.src.pipeline import start_parsing, rank_stream, shared_parse_pool
     CHALLENGE_1B_AVAILABLE = True
 except ImportError:
     import traceback
@@ -44,11 +81,137 @@ except ImportError:
     CHALLENGE_1B_AVAILABLE = False
 
 
+# Outline results cached by PDF content; OUTLINE_CACHE=0 turns it off
+OUTLINE_CACHE = None
+if CHALLENGE_1A_AVAILABLE:
+    OUTLINE_CACHE = OutlineCache(
+        os.environ.get('OUTLINE_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'outlines')),
+        max_bytes=int(os.environ.get('OUTLINE_CACHE_MAX_MB', '256')) * 1024 * 1024,
+        enabled=os.environ.get('OUTLINE_CACHE', '1') != '0'
+    )
+
+# Decoded PDF spans cached by content and shared by the 1A and 1B routes, so a
+# PDF uploaded to both is decoded once; PDF_IR_CACHE=0 turns it off
+IR_CACHE = None
+if CHALLENGE_1A_AVAILABLE:
+    IR_CACHE = IRCache(
+        os.environ.get('PDF_IR_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'ir')),
+        max_bytes=int(os.environ.get('PDF_IR_CACHE_MAX_MB', '512')) * 1024 * 1024,
+        enabled=os.environ.get('PDF_IR_CACHE', '1') != '0'
+    )
+
+# Outlines are extracted by EXTRACT_WORKERS processes (default: CPU count)
+# shared by all requests, each decoding one file at a time; a file still
+# running after EXTRACT_TIMEOUT seconds is reported as failed and its worker
+# killed (0 disables the limit). The pool belongs to this server process:
+# under serve.py with N workers there are N pools (serve.py divides the
+# default between them)
+EXTRACT_POOL = None
+if CHALLENGE_1A_AVAILABLE:
+    EXTRACT_POOL = OutlinePool(
+        workers=int(os.environ['EXTRACT_WORKERS']) if os.environ.get('EXTRACT_WORKERS') else None,
+        extractor_options={'cache': OUTLINE_CACHE, 'ir_cache': IR_CACHE, 'page_workers': 1},
+        timeout=float(os.environ.get('EXTRACT_TIMEOUT', '60'))
+    )
+
+# Section embeddings cached by model and text; EMBEDDING_CACHE=0 turns it off
+EMBEDDING_CACHE_DIR = None
+if os.environ.get('EMBEDDING_CACHE', '1') != '0':
+    EMBEDDING_CACHE_DIR = os.environ.get('EMBEDDING_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'embeddings'))
+EMBEDDING_CACHE = None
+
+# Embedding backend: "torch" (default) or "onnx" for the int8 ONNX Runtime export
+EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'torch')
+EMBEDDING_THREADS = int(os.environ['EMBEDDING_THREADS']) if os.environ.get('EMBEDDING_THREADS') else None
+
+# ANALYZE_PIPELINE=1 overlaps parsing, model loading, encoding and ranking in 1B requests
+ANALYZE_PIPELINE = os.environ.get('ANALYZE_PIPELINE', '0') == '1'
+
+# 1B analyses run as background jobs: JOB_WORKERS at a time, at most
+# JOB_QUEUE_SIZE more waiting (then 503), results kept JOB_TTL seconds.
+# JOB_STORE_DIR shares jobs between server processes (set by serve.py)
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '1'))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', '16'))
+ANALYSIS_JOBS = JobManager(
+    workers=JOB_WORKERS,
+    max_queued=JOB_QUEUE_SIZE,
+    ttl=int(os.environ.get('JOB_TTL', '3600')),
+    store_dir=os.environ.get('JOB_STORE_DIR') or None
+)
+
+# Admission control: a request costs one slot per ADMISSION_PAGES_PER_SLOT
+# pages or ADMISSION_MB_PER_SLOT MB of uploads (at least one). Each endpoint
+# runs requests worth at most its slots at once, with requests worth at most
+# its queue slots waiting; beyond that it answers 503 with Retry-After.
+# 1A: EXTRACT_SLOTS (default: extraction workers) and EXTRACT_QUEUE_SLOTS
+# (default 4x), waiting at most ADMISSION_WAIT seconds. 1B: JOB_WORKERS slots
+# and JOB_QUEUE_SIZE queue slots. Like the pools, the slots are counted per
+# server process: N serve.py workers admit N times as much.
+ADMISSION_PAGES_PER_SLOT = int(os.environ.get('ADMISSION_PAGES_PER_SLOT', '100'))
+ADMISSION_BYTES_PER_SLOT = int(os.environ.get('ADMISSION_MB_PER_SLOT', '20')) * 1024 * 1024
+ADMISSION_WAIT = float(os.environ.get('ADMISSION_WAIT', '30'))
+EXTRACT_SLOTS = int(os.environ.get('EXTRACT_SLOTS', EXTRACT_POOL.workers if EXTRACT_POOL else os.cpu_count() or 1))
+EXTRACT_ADMISSION = AdmissionController(
+    'extract',
+    slots=EXTRACT_SLOTS,
+    max_queued=int(os.environ.get('EXTRACT_QUEUE_SLOTS', 4 * EXTRACT_SLOTS))
+)
+ANALYZE_ADMISSION = AdmissionController('analyze', slots=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE)
+# Jobs wait for their ticket on a job worker, so tickets must be handed out
+# in the order the jobs are queued
+_ANALYZE_SUBMIT_LOCK = threading.Lock()
+
+
 # -------- Helpers --------
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def upload_source(file):
+    """An uploaded PDF as the parsers take it: its bytes, or the path of its spool file"""
+    stream = file.stream
+    if isinstance(stream, io.BytesIO):
+        return stream.getvalue()
+    stream.flush()
+    return stream.name
+
+
+def keep_upload(source, path):
+    """
+    An upload_source() that outlives the request: a spool file, deleted with
+    the request, is linked (or copied) to path first.
+    """
+    if isinstance(source, bytes):
+        return source
+    try:
+        os.link(source, path)
+    except OSError:  # another filesystem
+        shutil.copyfile(source, path)
+    return path
+
+
+def upload_cost(sources):
+    """Admission cost of upload_source() values, from their page counts and sizes"""
+    import fitz  # PyMuPDF
+    pages, nbytes = 0, 0
+    for source in sources:
+        nbytes += len(source) if isinstance(source, bytes) else os.path.getsize(source)
+        if pages is None:
+            continue
+        try:
+            # Opening only reads the page tree; nothing is decoded yet
+            with (fitz.open(stream=source, filetype='pdf') if isinstance(source, bytes) else fitz.open(source)) as doc:
+                pages += doc.page_count
+        except Exception:  # reported by the parser later; fall back to the size
+            pages = None
+    return estimate_cost(pages, nbytes, ADMISSION_PAGES_PER_SLOT, ADMISSION_BYTES_PER_SLOT)
+
+
+def overloaded(e):
+    """503 response for an AdmissionRejected"""
+    return jsonify({'error': 'The server is busy, please retry later'}), 503, {'Retry-After': str(e.retry_after)}
+
+
 # -------- Routes --------
 @app.route('/')
 def index():
@@ -77,9 +240,20 @@ def challenge1b():
 
 @app.route('/api/challenge1a/extract', methods=['POST'])
 def extract_outline():
+    """
+    Streams one JSON line per file (application/x-ndjson) in completion
+    order, as the shared extraction pool finishes each outline. Answers
+    503 when EXTRACT_ADMISSION has no room for the request.
+    """
     if not CHALLENGE_1A_AVAILABLE:
         return jsonify({'error': 'Challenge 1A is not available'}), 400
 
+    try:
+        # Before request.files: a full queue turns the upload away unread
+        EXTRACT_ADMISSION.check()
+    except AdmissionRejected as e:
+        return overloaded(e)
+
     if 'files' not in request.files:
         return jsonify({'error': 'No files provided'}), 400
 
@@ -87,57 +261,235 @@ def extract_outline():
     if not files or files[0].filename == '':
         return jsonify({'error': 'No files selected'}), 400
 
-    results = []
-    temp_dir = None
+    # ?cache=0 bypasses the outline cache for this request
+    use_cache = request.args.get('cache', '1') != '0'
+    rejected = []
+    sources = {}
+    futures = {}
+    ticket = None
 
     try:
-        # Create temporary directory
-        temp_dir = tempfile.mkdtemp()
-        extractor = PDFOutlineExtractor()
-
-        for file in files:
+        for index, file in enumerate(files):
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(temp_dir, filename)
-                file.save(file_path)
-
-                try:
-                    # Extract outline using Challenge 1A
-                    outline_data = extractor.extract_outline(file_path)
-                    results.append({
-                        'filename': file.filename,
-                        'success': True,
-                        'outline': outline_data
-                    })
-                except Exception as e:
-                    results.append({
-                        'filename': file.filename,
-                        'success': False,
-                        'error': str(e)
-                    })
+                # Extract outline using Challenge 1A, from memory unless the upload was spooled
+                sources[index] = (file.filename, upload_source(file))
             else:
-                results.append({
+                rejected.append({
+                    'index': index,
                     'filename': file.filename,
                     'success': False,
                     'error': 'Invalid file type. Only PDF files are allowed.'
                 })
 
+        # Large requests take more slots; wait for them, up to ADMISSION_WAIT seconds
+        ticket = EXTRACT_ADMISSION.admit(upload_cost(source for _, source in sources.values()))
+        if not ticket.wait(ADMISSION_WAIT):
+            raise AdmissionRejected('timed out waiting for a slot', EXTRACT_ADMISSION.retry_after())
+
+        for index, (filename, source) in sources.items():
+            futures[EXTRACT_POOL.submit(source, use_cache)] = (index, filename)
+
+    except AdmissionRejected as e:
+        return overloaded(e)
+
     except Exception as e:
+        for future in futures:
+            future.cancel()
+        if ticket is not None:
+            ticket.release_when_done(futures)
         return jsonify({'error': str(e)}), 500
 
+    # The slots are held until the pool is done with every file, including
+    # files the client stopped waiting for
+    ticket.release_when_done(futures)
+
+    def results():
+        for result in rejected:
+            yield json.dumps(result) + '\n'
+        for future, error in EXTRACT_POOL.as_completed(futures):
+            index, filename = futures[future]
+            if error is None:
+                try:
+                    outline_data, cached = future.result()
+                except Exception as e:  # worker process died
+                    error = f"worker failed: {e}"
+            if error is not None:
+                result = {'index': index, 'filename': filename, 'success': False, 'error': error}
+            else:
+                if cached is not None and OUTLINE_CACHE is not None:
+                    # Mirror the workers' cache counters for /api/health
+                    if cached:
+                        OUTLINE_CACHE.hits += 1
+                    else:
+                        OUTLINE_CACHE.misses += 1
+                result = {
+                    'index': index,
+                    'filename': filename,
+                    'success': True,
+                    'outline': outline_data,
+                    'cached': bool(cached)
+                }
+            yield json.dumps(result) + '\n'
+
+    # The request context (and spooled uploads) stay alive until the stream ends;
+    # files not handed to a worker yet are dropped if it ends early
+    response = Response(stream_with_context(results()), mimetype='application/x-ndjson')
+    response.call_on_close(lambda: [future.cancel() for future in futures])
+    return response
+
+
+def _load_embedding_model():
+    """Loads the configured embedding backend and opens the embedding cache"""
+    global EMBEDDING_CACHE
+    load_model(backend=EMBEDDING_BACKEND, onnx_dir=os.environ.get('ONNX_MODEL_DIR'), threads=EMBEDDING_THREADS)
+    if EMBEDDING_CACHE_DIR:
+        EMBEDDING_CACHE = enable_embedding_cache(
+            EMBEDDING_CACHE_DIR,
+            capacity=int(os.environ.get('EMBEDDING_CACHE_SIZE', '200000'))
+        )
+
+
+def preload(warmup=True):
+    """
+    Loads up front what requests would otherwise load on first use: PyMuPDF
+    and the embedding model, followed by one warmup encode. serve.py calls
+    it in the master process, so forked workers share them copy-on-write.
+    The embedding cache is still opened per process, on first use.
+    """
+    import fitz  # noqa: F401  (PyMuPDF)
+    if not CHALLENGE_1B_AVAILABLE:
+        return
+    load_model(backend=EMBEDDING_BACKEND, onnx_dir=os.environ.get('ONNX_MODEL_DIR'), threads=EMBEDDING_THREADS)
+    if warmup:
+        encode_texts(["Travel Planner: Plan a trip of 4 days for a group of 10 college friends."])
+
+
+def _rank_sequential(documents, task_query, on_progress=None):
+    """Parses every PDF, then encodes every section, then ranks them"""
+    # Parse documents ((filename, source) pairs) into page-level sections
+    parsed_docs = {}
+    for doc_name, pages in parse_documents(None, documents, as_generator=True, ir_cache=IR_CACHE):
+        parsed_docs[doc_name] = pages
+        if on_progress:
+            on_progress("parsed", len(parsed_docs), len(documents))
+    print(f"🔍 Parsed {sum(len(pages) for pages in parsed_docs.values())} total pages from {len(parsed_docs)} documents")
+
+    section_chunks = []
+    for doc_name, pages in parsed_docs.items():
+        for page in pages:
+            # Always use the original filename if possible
+            section_chunks.append({
+                "document": doc_name if doc_name else page.get("filename", "Unknown Document"),
+                "page_number": page["page_number"],
+                "section_title": page.get("section_title", f"Page {page['page_number']}") ,
+                "text": page["text"]
+            })
+
+    # Filter short/noisy text chunks
+    MIN_TEXT_LEN = 100
+    section_chunks = [s for s in section_chunks if len(s["text"]) >= MIN_TEXT_LEN]
+    print(f"🔎 Filtered to {len(section_chunks)} sections with text length >= {MIN_TEXT_LEN}")
+
+    if not section_chunks:
+        return []
+
+    # Load model and encode everything
+    print("📦 Loading embedding model...")
+    if on_progress:
+        on_progress("loading_model")
+    _load_embedding_model()
+    task_embedding = encode_single(task_query)
+
+    print(f"🔍 Encoding {len(section_chunks)} document sections...")
+    if on_progress:
+        on_progress("encoded", 0, len(section_chunks))
+    section_texts = [section["text"] for section in section_chunks]
+    section_embeddings = encode_texts(section_texts)
+    if on_progress:
+        on_progress("encoded", len(section_chunks), len(section_chunks))
+
+    # Rank and extract top sections
+    print("📊 Ranking relevant sections...")
+    top_sections = rank_sections(task_embedding, section_embeddings, section_chunks, top_n=5)
+    return top_sections
+
+
+def _rank_pipelined(documents, task_query, on_progress=None):
+    """Parses in worker processes while the model loads and sections are encoded and ranked"""
+    # Parse workers are spawned once per server process and reused by every job
+    documents = start_parsing(None, documents, ir_cache=IR_CACHE, pool=shared_parse_pool())
+    try:
+        print("📦 Loading embedding model while parsing...")
+        if on_progress:
+            on_progress("loading_model")
+        _load_embedding_model()
+        task_embedding = encode_single(task_query)
+        result = rank_stream(documents, task_embedding, top_n=5, on_progress=on_progress)
+    finally:
+        documents.close()
+    timings = result['timings']
+    print(f"⏱️  Pipeline: {result['pages']} pages, {result['sections']} sections, parse {timings['parse']:.2f}s, "
+          f"encode {timings['encode']:.2f}s, total {timings['total']:.2f}s")
+    return result['top']
+
+
+def _run_analysis(job, ticket, temp_dir, documents, persona, job_to_be_done):
+    """
+    Background part of an analysis (a JobManager job): waits for its
+    ANALYZE_ADMISSION ticket, ranks the uploaded PDFs ((filename, bytes or
+    path) pairs), reporting progress on the job, and returns the output
+    JSON. Owns the ticket and temp_dir, if any.
+    """
+    try:
+        if not ticket.granted:
+            job.report("waiting")
+        ticket.wait()
+        document_filenames = [filename for filename, _ in documents]
+        task_query = f"{persona.strip()}: {job_to_be_done.strip()}"
+        if ANALYZE_PIPELINE:
+            top_sections = _rank_pipelined(documents, task_query, on_progress=job.report)
+        else:
+            top_sections = _rank_sequential(documents, task_query, on_progress=job.report)
+        if not top_sections:
+            raise ValueError('No meaningful text content found in the documents')
+
+        print("\n🏆 Top 5 Sections:")
+        for rank, (section, score) in enumerate(top_sections, start=1):
+            print(f"Rank {rank}: {section['document']} → {section['section_title']} (score={score:.4f})")
+
+        # Generate output JSON
+        print("\n📝 Generating final output...")
+        job.report("generating_output")
+        return generate_output_json(
+            input_documents=document_filenames,
+            persona=persona,
+            job_to_be_done=job_to_be_done,
+            ranked_sections=top_sections
+        )
+
     finally:
         # Cleanup
+        ticket.release()
         if temp_dir and os.path.exists(temp_dir):
             shutil.rmtree(temp_dir)
 
-    return jsonify({'results': results})
-
 
 @app.route('/api/challenge1b/analyze', methods=['POST'])
 def analyze_documents():
+    """
+    Queues the analysis of the uploads; answers 202 with the job id
+    and its status and events URLs, or 503 when ANALYZE_ADMISSION or
+    the job queue is full.
+    """
     if not CHALLENGE_1B_AVAILABLE:
         return jsonify({'error': 'Challenge 1B is not available'}), 400
 
+    try:
+        # Before request.files: a full queue turns the upload away unread
+        ANALYZE_ADMISSION.check()
+    except AdmissionRejected as e:
+        return overloaded(e)
+
     if 'files' not in request.files:
         return jsonify({'error': 'No files provided'}), 400
 
@@ -152,78 +504,44 @@ def analyze_documents():
         return jsonify({'error': 'Please provide both persona and job to be done'}), 400
 
     temp_dir = None
+    ticket = None
+    submitted = False
 
     try:
-        # Create temporary directory
-        temp_dir = tempfile.mkdtemp()
-        pdf_dir = os.path.join(temp_dir, 'PDFs')
-        os.makedirs(pdf_dir)
-
-        document_filenames = []
+        documents = []
 
-        # Save uploaded files
+        # Uploads held in memory are handed to the job as bytes; spooled ones
+        # are kept in a temporary directory (removed by the job once it is queued)
         for file in files:
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(pdf_dir, filename)
-                file.save(file_path)
-                document_filenames.append(filename)
+                source = upload_source(file)
+                if not isinstance(source, bytes):
+                    temp_dir = temp_dir or tempfile.mkdtemp()
+                    source = keep_upload(source, os.path.join(temp_dir, f"{len(documents)}.pdf"))
+                documents.append((secure_filename(file.filename), source))
 
-        if not document_filenames:
+        if not documents:
             return jsonify({'error': 'No valid PDF files found'}), 400
 
-        # Parse documents into page-level sections
-        parsed_docs = parse_documents(pdf_dir, document_filenames)
-        print(f"🔍 Parsed {sum(len(pages) for pages in parsed_docs.values())} total pages from {len(parsed_docs)} documents")
-
-        section_chunks = []
-        for doc_name, pages in parsed_docs.items():
-            for page in pages:
-                # Always use the original filename if possible
-                section_chunks.append({
-                    "document": doc_name if doc_name else page.get("filename", "Unknown Document"),
-                    "page_number": page["page_number"],
-                    "section_title": page.get("section_title", f"Page {page['page_number']}") ,
-                    "text": page["text"]
-                })
-
-        # Filter short/noisy text chunks
-        MIN_TEXT_LEN = 100
-        section_chunks = [s for s in section_chunks if len(s["text"]) >= MIN_TEXT_LEN]
-        print(f"🔎 Filtered to {len(section_chunks)} sections with text length >= {MIN_TEXT_LEN}")
-
-        if not section_chunks:
-            return jsonify({'error': 'No meaningful text content found in the documents'}), 400
+        # Large requests take more slots; the job waits for them
+        cost = upload_cost(source for _, source in documents)
+        with _ANALYZE_SUBMIT_LOCK:
+            ticket = ANALYZE_ADMISSION.admit(cost)
+            job = ANALYSIS_JOBS.submit('challenge1b', _run_analysis, ticket, temp_dir, documents, persona, job_to_be_done)
+        submitted = True
 
-        # Load model and encode everything
-        print("📦 Loading embedding model...")
-        model = load_model()
+        return jsonify({
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': url_for('analysis_status', job_id=job.id),
+            'events_url': url_for('analysis_events', job_id=job.id)
+        }), 202
 
-        task_query = f"{persona.strip()}: {job_to_be_done.strip()}"
-        task_embedding = encode_single(task_query)
-
-        print(f"🔍 Encoding {len(section_chunks)} document sections...")
-        section_texts = [section["text"] for section in section_chunks]
-        section_embeddings = encode_texts(section_texts)
-
-        # Rank and extract top sections
-        print("📊 Ranking relevant sections...")
-        top_sections = rank_sections(task_embedding, section_embeddings, section_chunks, top_n=5)
-
-        print("\n🏆 Top 5 Sections:")
-        for rank, (section, score) in enumerate(top_sections, start=1):
-            print(f"Rank {rank}: {section['document']} → {section['section_title']} (score={score:.4f})")
-
-        # Generate output JSON
-        print("\n📝 Generating final output...")
-        output_data = generate_output_json(
-            input_documents=document_filenames,
-            persona=persona,
-            job_to_be_done=job_to_be_done,
-            ranked_sections=top_sections
-        )
+    except AdmissionRejected as e:
+        return overloaded(e)
 
-        return jsonify(output_data)
+    except JobQueueFull:
+        return jsonify({'error': 'Too many analyses in progress, please retry later'}), 503, {'Retry-After': '30'}
 
     except Exception as e:
         import traceback
@@ -231,17 +549,57 @@ def analyze_documents():
         return jsonify({'error': str(e)}), 500
 
     finally:
-        # Cleanup
-        if temp_dir and os.path.exists(temp_dir):
+        # Cleanup, unless the job took over the files and the ticket
+        if not submitted and ticket is not None:
+            ticket.release()
+        if not submitted and temp_dir and os.path.exists(temp_dir):
             shutil.rmtree(temp_dir)
 
 
+@app.route('/api/challenge1b/jobs/<job_id>')
+def analysis_status(job_id):
+    """Status, stage progress and, once done, the result of an analysis job"""
+    job = ANALYSIS_JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/challenge1b/jobs/<job_id>/events')
+def analysis_events(job_id):
+    """
+    Progress of an analysis job as Server-Sent Events ("progress", then
+    "done" or "failed"); a reconnecting client resumes after Last-Event-ID.
+    """
+    job = ANALYSIS_JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', '0'))
+    except ValueError:
+        last_event_id = 0
+    return Response(
+        sse_events(job, last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/health')
 def health_check():
     return jsonify({
         'status': 'OK',
         'challenge_1a_available': CHALLENGE_1A_AVAILABLE,
-        'challenge_1b_available': CHALLENGE_1B_AVAILABLE
+        'challenge_1b_available': CHALLENGE_1B_AVAILABLE,
+        'outline_cache': OUTLINE_CACHE.stats() if OUTLINE_CACHE else None,
+        'ir_cache': IR_CACHE.stats() if IR_CACHE else None,
+        'extract_pool': EXTRACT_POOL.stats() if EXTRACT_POOL else None,
+        'embedding_cache': EMBEDDING_CACHE.stats() if EMBEDDING_CACHE else None,
+        'analysis_jobs': ANALYSIS_JOBS.stats(),
+        'admission': {
+            'extract': EXTRACT_ADMISSION.stats(),
+            'analyze': ANALYZE_ADMISSION.stats()
+        }
     })
 
 
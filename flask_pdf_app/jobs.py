@@ -0,0 +1,289 @@
+"""
+Background jobs for long-running requests.
+
+A route hands its work to JobManager.submit() and answers right away with
+the job id; a bounded pool of worker threads runs the work. Each job keeps
+an ordered log of events (stage progress, then "done" or "failed") that a
+client can poll through its status or follow as Server-Sent Events.
+Finished jobs and their results are dropped ttl seconds after completion.
+
+With store_dir set, every job also writes its state and events to
+<store_dir>/<id>.json, so that server processes sharing the directory
+(e.g. preforked workers behind one socket) can answer for each other's
+jobs: get() falls back to a StoredJob, which re-reads that file.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_WORKERS = 1
+DEFAULT_MAX_QUEUED = 16
+DEFAULT_TTL = 3600
+# Seconds between SSE comment lines that keep idle connections open
+KEEPALIVE_SECONDS = 15
+# How often a StoredJob re-reads its file while waiting for events
+STORE_POLL_SECONDS = 0.25
+
+
+class JobQueueFull(Exception):
+    """Raised by submit() when every worker is busy and the queue is full"""
+
+
+class Job:
+    """State and event log of one job; every method is thread-safe"""
+
+    def __init__(self, job_id: str, kind: str, store_path: Optional[str] = None):
+        self.id = job_id
+        self.kind = kind
+        self.status = 'queued'  # queued, running, done, failed
+        self.stage = 'queued'
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.events = []  # (event id, event name, data)
+        self.store_path = store_path
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def report(self, stage: str, done: Optional[int] = None, total: Optional[int] = None):
+        """Records progress: a new stage, or done/total within a stage"""
+        with self._condition:
+            self.stage = stage
+            if done is not None:
+                self.progress[stage] = {'done': done, 'total': total}
+            self._emit('progress', {'stage': stage, 'done': done, 'total': total})
+
+    def _start(self):
+        with self._condition:
+            self.status = 'running'
+            self._emit('status', {'status': 'running'})
+
+    def _finish(self, result=None, error: Optional[str] = None):
+        with self._condition:
+            self.result = result
+            self.error = error
+            self.status = 'failed' if error is not None else 'done'
+            self.stage = self.status
+            self.finished_at = time.time()
+            self._emit(self.status, {'status': self.status, 'error': error})
+
+    def _emit(self, name: str, data: Dict):
+        self.events.append((len(self.events) + 1, name, data))
+        if self.store_path:
+            self._save()
+        self._condition.notify_all()
+
+    def _save(self):
+        """Writes state and events to store_path (atomically: readers never see a partial file)"""
+        state = self.to_dict()
+        state['result'] = self.result
+        state['events'] = self.events
+        directory = os.path.dirname(self.store_path)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(temp_path, self.store_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def wait_events(self, after: int, timeout: float) -> Tuple[List[Tuple[int, str, Dict]], bool]:
+        """Events with an id above `after` (waiting up to timeout for one), and whether the job is finished"""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.events) > after or self.finished, timeout)
+            return self.events[after:], self.finished
+
+    def to_dict(self, include_result: bool = True) -> Dict:
+        with self._condition:  # reentrant: also called by _save
+            data = {
+                'job_id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'stage': self.stage,
+                'progress': dict(self.progress),
+                'created_at': self.created_at,
+                'finished_at': self.finished_at,
+                'error': self.error,
+            }
+            if include_result and self.status == 'done':
+                data['result'] = self.result
+            return data
+
+
+class StoredJob(Job):
+    """
+    Read-only view of a job run by another process, loaded from its store
+    file and re-read while waiting for events
+    """
+
+    def __init__(self, store_path: str):
+        super().__init__('', '', store_path)
+        if not self._refresh():
+            raise FileNotFoundError(store_path)
+
+    def _refresh(self) -> bool:
+        try:
+            with open(self.store_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        with self._condition:
+            self.id = state['job_id']
+            self.kind = state['kind']
+            self.status = state['status']
+            self.stage = state['stage']
+            self.progress = state['progress']
+            self.result = state['result']
+            self.error = state['error']
+            self.created_at = state['created_at']
+            self.finished_at = state['finished_at']
+            self.events = [tuple(event) for event in state['events']]
+        return True
+
+    def wait_events(self, after: int, timeout: float) -> Tuple[List[Tuple[int, str, Dict]], bool]:
+        deadline = time.monotonic() + timeout
+        while True:
+            self._refresh()
+            if len(self.events) > after or self.finished or time.monotonic() >= deadline:
+                return self.events[after:], self.finished
+            time.sleep(STORE_POLL_SECONDS)
+
+
+class JobManager:
+    """
+    Runs jobs on `workers` threads. At most max_queued jobs wait for a free
+    worker; beyond that submit() raises JobQueueFull instead of queueing
+    unbounded work. Jobs are forgotten ttl seconds after they finish.
+
+    store_dir shares jobs between processes (see the module docstring); the
+    workers and queue bounds stay per process.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_queued: int = DEFAULT_MAX_QUEUED,
+                 ttl: float = DEFAULT_TTL, store_dir: Optional[str] = None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.store_dir = store_dir
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._active = 0
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def submit(self, kind: str, fn: Callable, *args, **kwargs) -> Job:
+        """
+        Queues fn(job, *args, **kwargs); its return value becomes the job
+        result and an exception fails the job with its message.
+        """
+        self.sweep()
+        with self._lock:
+            if self._active >= self.workers + self.max_queued:
+                self.rejected += 1
+                raise JobQueueFull(f"{self._active} jobs are queued or running")
+            job_id = uuid.uuid4().hex
+            job = Job(job_id, kind, self._store_path(job_id))
+            self._jobs[job.id] = job
+            self._active += 1
+            self.submitted += 1
+        if job.store_path:
+            with job._condition:
+                job._save()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _store_path(self, job_id: str) -> Optional[str]:
+        return os.path.join(self.store_dir, f"{job_id}.json") if self.store_dir else None
+
+    def _run(self, job: Job, fn: Callable, args, kwargs):
+        job._start()
+        try:
+            result = fn(job, *args, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                self.failed += 1
+            job._finish(error=str(e))
+        else:
+            job._finish(result)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """A job of this manager, or (with store_dir) of another process"""
+        self.sweep()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store_dir and job_id.isalnum():
+            try:
+                job = StoredJob(self._store_path(job_id))
+            except FileNotFoundError:
+                return None
+            if job.finished_at is not None and job.finished_at < time.time() - self.ttl:
+                return None
+        return job
+
+    def sweep(self):
+        """Drops jobs that finished more than ttl seconds ago"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        if self.store_dir:
+            # Files of jobs finished (or abandoned by a dead process) more than ttl ago
+            for name in os.listdir(self.store_dir):
+                path = os.path.join(self.store_dir, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.unlink(path)
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queued': self.max_queued,
+                'ttl_seconds': self.ttl,
+                'active': self._active,
+                'retained': len(self._jobs),
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'failed': self.failed,
+            }
+
+
+def sse_events(job: Job, last_event_id: int = 0, keepalive: float = KEEPALIVE_SECONDS) -> Iterator[str]:
+    """
+    Server-Sent Events for a job, starting after last_event_id (the
+    Last-Event-ID of a reconnecting client), until the job finishes.
+    """
+    after = last_event_id
+    while True:
+        events, finished = job.wait_events(after, keepalive)
+        for event_id, name, data in events:
+            yield f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+            after = event_id
+        if finished and after >= len(job.events):
+            return
+        if not events:
+            yield ": keepalive\n\n"
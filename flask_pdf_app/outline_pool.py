@@ -0,0 +1,307 @@
+"""
+App-wide process pool for Challenge 1A outline extraction.
+
+Every /api/challenge1a/extract request submits its files to the same
+OutlinePool: `workers` warm processes, each with its own
+PDFOutlineExtractor. The pool is started on first use, and started again
+in a forked child or after a worker process died. as_completed() hands
+results back in completion order and gives up on a file that has been
+running for more than `timeout` seconds.
+
+Workers report each file as they start it, so the timeout counts from
+that moment rather than from when the executor queued the file for them.
+A process pool cannot interrupt a running task, so the worker of a timed
+out file is killed. That breaks the executor: its other files are
+resubmitted once to a new one, and start again from scratch.
+"""
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, InvalidStateError, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from Challenge_1a_Solution.process_pdfs import PDFOutlineExtractor
+
+DEFAULT_TIMEOUT = 60
+# How often as_completed() looks for files that started running
+POLL_SECONDS = 0.1
+# Submissions of one file: the first, and one more if its executor broke
+MAX_ATTEMPTS = 2
+
+# Extractor of this worker process, created once by the pool initializer,
+# and the queue it reports started files on
+_extractor = None
+_started = None
+
+
+def _init_pool_worker(extractor_options: Optional[Dict] = None, started=None):
+    global _extractor, _started
+    _extractor = PDFOutlineExtractor(**(extractor_options or {}))
+    _started = started
+
+
+def _extract_outline(task_id: int, pdf, use_cache: bool = True) -> Tuple[Dict, Optional[bool]]:
+    """extract_outline in a worker: the outline, and whether it came from the cache"""
+    if _started is not None:
+        _started.put((task_id, os.getpid()))
+    cache = _extractor.cache
+    if not use_cache:
+        _extractor.cache = None
+    try:
+        return _extractor.extract_outline(pdf), _extractor.last_cache_hit
+    finally:
+        _extractor.cache = cache
+
+
+class OutlineFuture(Future):
+    """
+    The outline of one submitted file. It is running from the moment a
+    worker reports starting it (started_at, pid), and outlives the executor
+    future it is currently submitted as.
+    """
+
+    def __init__(self, task_id: int, pdf, use_cache: bool):
+        super().__init__()
+        self.task_id = task_id
+        self.pdf = pdf
+        self.use_cache = use_cache
+        self.attempts = 0
+        self.started_at = None
+        self.pid = None
+        self.expired = False
+        self.inner = None
+
+    def cancel(self) -> bool:
+        # Only a file no worker has been handed yet can be cancelled
+        inner = self.inner
+        if inner is not None and not inner.cancel():
+            return False
+        return super().cancel()
+
+    def _started(self, pid: int):
+        self.pid = pid
+        self.started_at = time.monotonic()
+        with self._condition:
+            # Not when running already (a resubmission) or finished
+            if self._state == 'PENDING':
+                self.set_running_or_notify_cancel()
+
+
+class OutlinePool:
+    """Bounded process pool shared by all requests, with per-file timeouts"""
+
+    def __init__(self, workers: Optional[int] = None, extractor_options: Optional[Dict] = None,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT):
+        self.workers = workers or os.cpu_count() or 1
+        self.extractor_options = extractor_options
+        self.timeout = timeout  # None or 0: no limit
+        self._pool = None
+        self._started = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._tasks = {}  # task_id -> OutlineFuture not yet done
+        self._running = {}  # worker pid -> task_id it last started
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.killed = 0
+        self.retried = 0
+        self.restarts = 0
+
+    def _executor(self, broken: Optional[ProcessPoolExecutor] = None) -> ProcessPoolExecutor:
+        with self._lock:
+            if broken is not None and self._pool is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._retire()
+                self.restarts += 1
+            if self._pool is None or self._pid != os.getpid():
+                if self._pid is not None and self._pid != os.getpid():
+                    # A forked child: the parent's executor, listener and files are not ours
+                    self._tasks, self._running = {}, {}
+                else:
+                    self._retire()
+                # One queue per executor: a killed worker may leave its lock held
+                self._started = multiprocessing.SimpleQueue()
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_pool_worker,
+                                                 initargs=(self.extractor_options, self._started))
+                self._pid = os.getpid()
+                threading.Thread(target=self._listen, args=(self._started,), daemon=True,
+                                 name='outline-pool-listener').start()
+            return self._pool
+
+    def _retire(self):
+        """Stops the listener of the current executor (lock held)"""
+        if self._started is not None and self._pid == os.getpid():
+            self._started.put(None)
+        self._pool = None
+        self._started = None
+
+    def _listen(self, started):
+        while True:
+            try:
+                message = started.get()
+            except (EOFError, OSError):
+                return
+            if message is None:
+                return
+            task_id, pid = message
+            with self._lock:
+                self._running[pid] = task_id
+                future = self._tasks.get(task_id)
+            if future is not None:
+                future._started(pid)
+
+    def submit(self, pdf, use_cache: bool = True) -> OutlineFuture:
+        """Queues the outline of one PDF (a path or its bytes)"""
+        with self._lock:
+            future = OutlineFuture(next(self._task_ids), pdf, use_cache)
+            self._tasks[future.task_id] = future
+            self.submitted += 1
+        future.add_done_callback(self._forget)
+        self._submit(future)
+        return future
+
+    def _submit(self, future: OutlineFuture):
+        pool = self._executor()
+        try:
+            inner = pool.submit(_extract_outline, future.task_id, future.pdf, future.use_cache)
+        except BrokenProcessPool:  # a worker died (e.g. killed by the OS)
+            pool = self._executor(broken=pool)
+            inner = pool.submit(_extract_outline, future.task_id, future.pdf, future.use_cache)
+        future.attempts += 1
+        future.inner = inner
+        inner.add_done_callback(lambda inner: self._settle(future, inner, pool))
+
+    def _settle(self, future: OutlineFuture, inner: Future, pool: ProcessPoolExecutor):
+        """Passes the executor future's outcome on, or resubmits after the executor broke"""
+        if future.done():  # timed out, or cancelled
+            return
+        if inner.cancelled():
+            if not Future.cancel(future):
+                self._set(future, BrokenProcessPool("the process pool was shut down"))
+            return
+        error = inner.exception()
+        if isinstance(error, BrokenProcessPool) and future.attempts < MAX_ATTEMPTS:
+            # Called from the broken executor's manager thread, which must not submit
+            with self._lock:
+                self.retried += 1
+            threading.Thread(target=self._resubmit, args=(future, pool), daemon=True).start()
+        elif error is not None:
+            self._set(future, error)
+        else:
+            try:
+                future.set_result(inner.result())
+            except InvalidStateError:  # timed out meanwhile
+                pass
+
+    def _resubmit(self, future: OutlineFuture, broken: ProcessPoolExecutor):
+        self._executor(broken=broken)
+        # Its clock starts again when a worker of the new executor starts it
+        future.started_at = future.pid = None
+        try:
+            self._submit(future)
+        except Exception as e:
+            self._set(future, e)
+
+    @staticmethod
+    def _set(future: Future, error: BaseException):
+        try:
+            future.set_exception(error)
+        except InvalidStateError:
+            pass
+
+    def _forget(self, future: OutlineFuture):
+        with self._lock:
+            self._tasks.pop(future.task_id, None)
+
+    def _expire(self, future: OutlineFuture) -> bool:
+        """
+        Fails a file that ran out of time and kills its worker, unless the
+        file finished meanwhile
+        """
+        future.expired = True
+        try:
+            future.set_exception(TimeoutError(f"timed out after {self.timeout:g}s"))
+        except InvalidStateError:
+            return False
+        with self._lock:
+            self.timed_out += 1
+            # The worker may have moved on to another file, which then is resubmitted
+            kill = self._running.get(future.pid) == future.task_id and self._pid == os.getpid()
+        if kill:
+            try:
+                os.kill(future.pid, signal.SIGKILL)
+                with self._lock:
+                    self.killed += 1
+            except ProcessLookupError:
+                pass
+        return True
+
+    def as_completed(self, futures: Iterable[OutlineFuture]) -> Iterator[Tuple[OutlineFuture, Optional[str]]]:
+        """
+        Yields (future, None) for each future as it finishes, and
+        (future, error) for one still running `timeout` seconds after its
+        worker started it; that worker is killed. Time spent queued behind
+        other requests does not count. Futures not yet yielded are
+        cancelled when the caller stops early.
+        """
+        pending = set(futures)
+        try:
+            while pending:
+                now = time.monotonic()
+                wait_seconds = POLL_SECONDS
+                if self.timeout:
+                    deadline = min((future.started_at + self.timeout for future in pending
+                                    if future.started_at is not None), default=now + wait_seconds)
+                    wait_seconds = max(0.0, min(wait_seconds, deadline - now))
+                done, _ = wait(pending, timeout=wait_seconds, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    self._record(future)
+                    yield future, None
+
+                if not self.timeout:
+                    continue
+                now = time.monotonic()
+                expired = [future for future in pending
+                           if future.started_at is not None and now - future.started_at >= self.timeout]
+                for future in expired:
+                    if self._expire(future):
+                        pending.discard(future)
+                        yield future, f"timed out after {self.timeout:g}s"
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _record(self, future: Future):
+        with self._lock:
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=True)
+            self._retire()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'timeout_seconds': self.timeout,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'timed_out': self.timed_out,
+                'killed': self.killed,
+                'retried': self.retried,
+                'restarts': self.restarts,
+            }
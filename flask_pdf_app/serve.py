@@ -0,0 +1,158 @@
+"""
+Production entry point: a preforking WSGI server for the Flask app.
+
+    python flask_pdf_app/serve.py --workers 4 --port 5000
+
+The master process imports the app and calls app.preload() (PyMuPDF, the
+embedding model and a warmup encode) before it listens or forks. Workers
+inherit the loaded model and share its weights copy-on-write instead of
+loading a copy each, and the first request does not pay a cold start.
+gc.freeze() moves everything loaded so far out of the collector's reach,
+so garbage collections in the workers do not write to (and unshare) those
+pages.
+
+With gunicorn installed, the app runs under it with preload_app and gthread
+workers (an SSE stream holds a thread, not a whole worker). Otherwise a
+stdlib fallback binds one listening socket, forks werkzeug servers that
+accept on it, and replaces a worker that dies.
+
+Workers keep their state in memory, so 1B analysis jobs are shared through
+JOB_STORE_DIR (default: flask_pdf_app/cache/jobs) when there is more than
+one worker; the job queue bounds (JOB_WORKERS, JOB_QUEUE_SIZE) apply per
+worker. So do the 1A extraction pool and its admission slots: unless
+EXTRACT_WORKERS is set, the CPUs are split between the workers, so the
+server as a whole runs about one extraction process per CPU.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_app(warmup: bool = True):
+    """Imports the app, preloads it and freezes the GC generations (master process)"""
+    start = time.perf_counter()
+    # Imported here: main() sets the environment the app reads at import time
+    try:
+        from . import app as app_module
+    except ImportError:
+        import app as app_module
+    app_module.preload(warmup=warmup)
+    gc.collect()
+    gc.freeze()
+    print(f"📦 Preloaded in {time.perf_counter() - start:.1f}s ({gc.get_freeze_count()} objects frozen)")
+    return app_module.app
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class PreloadedApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{args.host}:{args.port}")
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('preload_app', True)
+            self.cfg.set('timeout', args.timeout)
+
+        def load(self):
+            return load_app(args.warmup)
+
+    PreloadedApplication().run()
+
+
+def _serve_worker(app, host: str, port: int, fd: int):
+    """Body of a forked worker: a threaded werkzeug server on the inherited socket"""
+    from werkzeug.serving import make_server
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    server = make_server(host, port, app, threaded=True, fd=fd)
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+
+def run_prefork(args):
+    """Stdlib fallback: preload, bind, fork args.workers servers and keep them running"""
+    app = load_app(args.warmup)
+    family = socket.AF_INET6 if ':' in args.host else socket.AF_INET
+    listener = socket.create_server((args.host, args.port), family=family, backlog=128)
+    listener.set_inheritable(True)
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _serve_worker(app, args.host, args.port, listener.fileno())
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(args.workers):
+        spawn()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"🌐 Ready on http://{args.host}:{args.port} with {args.workers} workers (pids {sorted(children)})")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"⚠️  Worker {pid} exited with status {status}, starting a new one")
+            spawn()
+    listener.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Preforking production server for the PDF analysis app")
+    parser.add_argument("--host", default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', '5000')))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('WEB_WORKERS', '2')),
+                        help="Worker processes (default: $WEB_WORKERS or 2)")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get('WEB_THREADS', '8')),
+                        help="Threads per gunicorn worker (default: $WEB_THREADS or 8)")
+    parser.add_argument("--timeout", type=int, default=300,
+                        help="Seconds before gunicorn restarts a silent worker")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false",
+                        help="Skip the warmup encode in the master")
+    parser.add_argument("--no-gunicorn", action="store_true",
+                        help="Use the stdlib prefork server even if gunicorn is installed")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.workers > 1:
+        os.environ.setdefault('JOB_STORE_DIR', os.path.join(BASE_DIR, 'cache', 'jobs'))
+        # Per worker, and EXTRACT_SLOTS follows it
+        os.environ.setdefault('EXTRACT_WORKERS', str(max(1, (os.cpu_count() or 1) // args.workers)))
+    if not args.no_gunicorn:
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            print("gunicorn is not installed, using the stdlib prefork server")
+        else:
+            return run_gunicorn(args)
+    return run_prefork(args)
+
+
+if __name__ == '__main__':
+    main()